@@ -1,10 +1,19 @@
+import time
+
 from flask import Flask
 from .extensions import db, login_manager
 from .models import User
 from .utils import md_safe
+from .cache import load_user
 
 
 def create_app():
+    """Chỉ cấu hình, không đụng tới DB: mỗi worker gunicorn khởi động nhanh.
+
+    Tạo / nâng cấp schema và tạo admin là lệnh riêng (chạy một lần khi deploy):
+    ``flask db init`` và ``flask users create-admin``.
+    """
+    started = time.perf_counter()
     app = Flask(__name__)
     from config import Config
     app.config.from_object(Config)
@@ -13,9 +22,10 @@ def create_app():
     db.init_app(app)
     login_manager.init_app(app)
 
-    @login_manager.user_loader
-    def load_user(user_id):
-        return User.query.get(int(user_id))
+    login_manager.user_loader(load_user)      # cache.py – TTL/LRU, không query mỗi request
+
+    from . import metrics
+    metrics.init_app(app)                     # đăng ký trước mọi before_request khác
 
     # blueprints
     from .admin.routes import admin_bp
@@ -25,20 +35,21 @@ def create_app():
     app.register_blueprint(student_bp)          # root='/'
     app.register_blueprint(auth_bp)
 
+    from . import images
     app.jinja_env.filters["md"] = md_safe
-
-    with app.app_context():
-        db.create_all()
-
-        admin_username = "fil_admin"
-        admin_password = "fil_admin"
-        # seed default admin nếu chưa có
-        if not User.query.filter_by(username=admin_username).first():
-            from werkzeug.security import generate_password_hash
-            admin = User(username=admin_username,
-                         password_hash=generate_password_hash(admin_password),
-                         is_admin=True)
-            db.session.add(admin)
-            db.session.commit()
-
+    app.jinja_env.filters["variant"] = images.variant
+
+    # thread nền: chỉ khởi động ở request đầu tiên (app/background.py)
+    from . import background, ingest, cli, uploads, assets, sessions, autosave, sweeper
+    background.init_app(app)
+    sessions.init_app(app)
+    autosave.init_app(app)
+    ingest.init_app(app)
+    sweeper.init_app(app)
+    uploads.init_app(app)
+    assets.init_app(app)
+    cli.init_app(app)
+
+    app.extensions["startup_seconds"] = time.perf_counter() - started
+    app.logger.info("create_app: %.0f ms", app.extensions["startup_seconds"] * 1000)
     return app
@@ -1,14 +1,32 @@
+import hmac
+import tempfile
+from datetime import datetime
 from flask import (render_template, redirect, url_for, request,
-                   flash, abort, current_app)
+                   flash, abort, current_app, jsonify, Response,
+                   stream_with_context, send_file)
 from flask_login import (login_user, logout_user,
                          login_required, current_user)
 from werkzeug.security import generate_password_hash, check_password_hash
-from sqlalchemy import func, desc, asc
+from sqlalchemy import func, desc, asc, select, and_, or_
+from sqlalchemy.orm import contains_eager, joinedload, aliased
 
 from . import admin_bp
 from ..extensions import db
-from ..models import User, Exam, Question, Option, Submission, SubmissionAnswer, Class
-from ..utils import save_image, _delete_file
+from ..models import (User, Exam, Question, Option, Submission, SubmissionAnswer,
+                      Class, elapsed_seconds)
+from ..utils import save_image, md_safe
+from ..cache import (bump_exam_version, exam_fragment,
+                     invalidate_user, cache_stats)
+from .. import ingest, export, stats, metrics
+
+DASHBOARD_PER_PAGE = 50
+SUBMISSIONS_PER_PAGE = 100
+
+
+def _analytics():
+    """app/analytics.py kéo theo NumPy (~0,2 s): chỉ import khi cần lần đầu."""
+    from .. import analytics
+    return analytics
 
 
 # ---------- Auth ----------
@@ -44,8 +62,43 @@ def dashboard():
     if not current_user.is_admin:
         flash("Không đủ quyền", "warning")
         return redirect(url_for("student.index"))
-    exams = Exam.query.all()
-    return render_template("admin_dashboard.html", exams=exams)
+
+    page     = max(request.args.get("page", 1, type=int), 1)
+    class_id = request.args.get("class_id", type=int)
+    per_page = DASHBOARD_PER_PAGE
+
+    # đếm bằng subquery tương quan -> chỉ chạy cho các đề trên trang này
+    n_questions = (select(func.count(Question.id))
+                   .where(Question.exam_id == Exam.id)
+                   .scalar_subquery())
+    n_submissions = (select(func.count(Submission.id))
+                     .where(Submission.exam_id == Exam.id,
+                            Submission.score.is_not(None))
+                     .scalar_subquery())
+
+    stmt = (select(Exam.id, Exam.title, Exam.duration_minutes,
+                   Class.name.label("class_name"),
+                   n_questions.label("n_questions"),
+                   n_submissions.label("n_submissions"))
+            .outerjoin(Class, Class.id == Exam.class_id))
+    total_stmt = select(func.count(Exam.id))
+    if class_id:
+        stmt = stmt.where(Exam.class_id == class_id)
+        total_stmt = total_stmt.where(Exam.class_id == class_id)
+
+    total = db.session.execute(total_stmt).scalar()
+    exams = db.session.execute(stmt.order_by(Exam.id.desc())
+                                   .limit(per_page)
+                                   .offset((page - 1) * per_page)).all()
+
+    return render_template("admin_dashboard.html",
+                           exams=exams,
+                           classes=Class.query.order_by(Class.name).all(),
+                           class_id=class_id,
+                           page=page,
+                           pages=max((total + per_page - 1) // per_page, 1),
+                           total=total,
+                           offset=(page - 1) * per_page)
 
 
 # ---------- CRUD Exam ----------
@@ -111,6 +164,7 @@ def add_question(exam_id):
                         .filter_by(exam_id=exam.id).scalar() or 0
 
     q = Question(text=q_text or "",
+                 text_html=md_safe(q_text),
                  image_path=q_img,
                  order_idx=max_idx + 1,
                  exam=exam)
@@ -132,6 +186,7 @@ def add_question(exam_id):
 
         db.session.add(Option(
             text=o_text or "",
+            text_html=md_safe(o_text),
             image_path=o_img,
             is_correct=is_corr,
             question=q
@@ -142,11 +197,44 @@ def add_question(exam_id):
         db.session.rollback()
         return redirect(url_for("admin.edit_exam", exam_id=exam.id))
 
+    bump_exam_version(exam.id)
     db.session.commit()
     flash("Đã thêm câu hỏi.", "success")
     return redirect(url_for("admin.edit_exam", exam_id=exam.id))
 
 
+@admin_bp.route("/exam/<int:exam_id>/import", methods=["POST"])
+@login_required
+def import_questions(exam_id):
+    if not current_user.is_admin:
+        abort(403)
+    exam = Exam.query.get_or_404(exam_id)
+
+    upload = request.files.get("questions_file")
+    if not upload or upload.filename == "":
+        flash("Chọn file câu hỏi (.json / .csv / .md).", "warning")
+        return redirect(url_for("admin.edit_exam", exam_id=exam.id))
+    fmt = upload.filename.rsplit(".", 1)[-1].lower()
+    images = request.files.get("images_zip")
+
+    from .. import importer                   # markdown / zip: chỉ nạp khi nhập đề
+    try:
+        added, errors = importer.import_questions(
+            exam, fmt, upload.read(),
+            zip_bytes=images.read() if images and images.filename else None,
+            allowed_ext=current_app.config["ALLOWED_EXTENSIONS"])
+    except importer.ImportFormatError as exc:
+        flash(f"Không nhập được: {exc}", "danger")
+        return redirect(url_for("admin.edit_exam", exam_id=exam.id))
+
+    if errors:
+        return render_template("import_report.html", exam=exam,
+                               filename=upload.filename, errors=errors), 422
+
+    flash(f"Đã nhập {added} câu hỏi.", "success")
+    return redirect(url_for("admin.edit_exam", exam_id=exam.id))
+
+
 @admin_bp.route("/exam/<int:exam_id>/submissions")
 @login_required
 def view_submissions(exam_id):
@@ -155,35 +243,136 @@ def view_submissions(exam_id):
 
     sort      = request.args.get("sort", "end_time")   # default = Ended ↓
     direction = request.args.get("dir",  "desc")
+    if sort not in {"score", "start_time", "end_time", "elapsed"}:
+        sort = "end_time"
+    if direction not in {"asc", "desc"}:
+        direction = "desc"
 
     exam = Exam.query.get_or_404(exam_id)
 
-    qry = (Submission.query
-           .filter_by(exam=exam)
-           .filter(Submission.score.is_not(None)))
+    elapsed = elapsed_seconds().label("elapsed")
+    col = elapsed if sort == "elapsed" else getattr(Submission, sort)
+
+    # user lấy trong cùng query, elapsed tính trong SQL
+    stmt = (select(Submission, elapsed)
+            .join(Submission.user)
+            .options(contains_eager(Submission.user))
+            .where(Submission.exam_id == exam.id,
+                   Submission.score.is_not(None)))
+
+    # ---------- keyset: after = "<giá trị sort>|<id>" của dòng cuối trang trước ----------
+    # start/end_time có thể NULL: ghi là "null" và luôn xếp cuối (NULLS LAST)
+    after = request.args.get("after")
+    if after:
+        try:
+            raw_value, raw_id = after.rsplit("|", 1)
+            if raw_value == "null":
+                value = None
+            elif sort in {"start_time", "end_time"}:
+                value = datetime.fromisoformat(raw_value)
+            else:
+                value = int(raw_value)
+            last_id = int(raw_id)
+        except ValueError:
+            abort(400)
+        id_beyond = (Submission.id < last_id if direction == "desc"
+                     else Submission.id > last_id)
+        if value is None:
+            stmt = stmt.where(col.is_(None), id_beyond)
+        else:
+            beyond = col < value if direction == "desc" else col > value
+            stmt = stmt.where(or_(beyond, and_(col == value, id_beyond),
+                                  col.is_(None)))
+
+    order = desc if direction == "desc" else asc
+    rows = db.session.execute(stmt.order_by(order(col).nulls_last(),
+                                            order(Submission.id))
+                                  .limit(SUBMISSIONS_PER_PAGE + 1)).all()
+
+    next_after = None
+    if len(rows) > SUBMISSIONS_PER_PAGE:
+        rows = rows[:SUBMISSIONS_PER_PAGE]
+        last_sub, last_elapsed = rows[-1]
+        last_value = last_elapsed if sort == "elapsed" else getattr(last_sub, sort)
+        if last_value is None:
+            last_value = "null"
+        elif isinstance(last_value, datetime):
+            last_value = last_value.isoformat()
+        next_after = f"{last_value}|{last_sub.id}"
+
+    shown = max(request.args.get("shown", 0, type=int), 0)
+    return render_template("submissions.html",
+                           exam=exam,
+                           subs=rows,
+                           sort=sort,
+                           dir=direction,
+                           shown=shown,
+                           next_after=next_after,
+                           is_first_page=not after)
 
-    if sort in {"score", "start_time", "end_time"}:
-        col   = getattr(Submission, sort)
-        order = desc(col) if direction == "desc" else asc(col)
-        subs  = qry.order_by(order).all()
 
-    else:  # sort == 'elapsed'
-        subs = qry.all()
+@admin_bp.route("/exam/<int:exam_id>/analysis")
+@login_required
+def exam_analysis(exam_id):
+    if not current_user.is_admin:
+        abort(403)
+    exam = Exam.query.get_or_404(exam_id)
+    return render_template("item_analysis.html", exam=exam,
+                           report=_analytics().item_analysis(exam.id))
 
-        def elapsed_sec(s):
-            if s.start_time and s.end_time:
-                return (s.end_time - s.start_time).total_seconds()
-            return -1                              # bản ghi lỗi dữ liệu
-        subs.sort(key=elapsed_sec,
-                  reverse=(direction == "desc"))
 
-    return render_template("submissions.html",
-                           exam=exam,
-                           subs=subs,
-                           sort=sort,
-                           dir=direction)
+@admin_bp.route("/exam/<int:exam_id>/analysis.json")
+@login_required
+def exam_analysis_json(exam_id):
+    if not current_user.is_admin:
+        abort(403)
+    exam = Exam.query.get_or_404(exam_id)
+    return jsonify(_analytics().item_analysis(exam.id))
+
+
+@admin_bp.route("/exam/<int:exam_id>/export.<fmt>")
+@login_required
+def export_exam(exam_id, fmt):
+    if not current_user.is_admin:
+        abort(403)
+    exam = Exam.query.get_or_404(exam_id)
+    header, rows = export.exam_table(exam)
+    return _export_response(header, rows, f"exam_{exam.id}", fmt,
+                            url_for("admin.view_submissions", exam_id=exam.id))
 
 
+@admin_bp.route("/class/<int:cid>/export.<fmt>")
+@login_required
+def export_class(cid, fmt):
+    if not current_user.is_admin:
+        abort(403)
+    classroom = Class.query.get_or_404(cid)
+    header, rows = export.class_table(classroom)
+    return _export_response(header, rows, f"class_{classroom.id}", fmt,
+                            url_for("admin.list_classes"))
+
+
+def _export_response(header, rows, name, fmt, back_url):
+    if fmt == "csv":
+        return Response(stream_with_context(export.iter_csv(header, rows)),
+                        mimetype="text/csv",
+                        headers={"Content-Disposition":
+                                 f"attachment; filename={name}.csv"})
+    if fmt == "xlsx":
+        try:
+            import openpyxl  # noqa: F401
+        except ImportError:
+            flash("Cần cài openpyxl để xuất XLSX – dùng CSV thay thế.", "warning")
+            return redirect(back_url)
+        tmp = tempfile.TemporaryFile()          # ghi ra đĩa, không giữ trong RAM
+        export.write_xlsx(header, rows, tmp)
+        tmp.seek(0)
+        return send_file(tmp, as_attachment=True,
+                         download_name=f"{name}.xlsx",
+                         mimetype="application/vnd.openxmlformats-"
+                                  "officedocument.spreadsheetml.sheet")
+    abort(404)
+
 
 @admin_bp.route("/question/<int:q_id>/edit", methods=["GET", "POST"])
 @login_required
@@ -194,29 +383,28 @@ def edit_question(q_id):
 
     if request.method == "POST":
         q.text = request.form.get("question_text", "").strip()
+        q.text_html = md_safe(q.text)
 
         # ─── Question image ────────────────────────────────────────
+        # file cũ được app/uploads.py nhả sau commit nếu không câu nào khác dùng
         if "remove_q_image" in request.form:
-            _delete_file(q.image_path)          # tuỳ – xoá file vật lý
             q.image_path = None
         new_q_img = save_image(request.files.get("question_image"))
         if new_q_img:
-            _delete_file(q.image_path)
             q.image_path = new_q_img
 
         # ─── Options ───────────────────────────────────────────────
         for idx, opt in enumerate(q.options, start=1):
             opt.text = request.form.get(f"option_{idx}", "").strip()
+            opt.text_html = md_safe(opt.text)
 
             # remove?
             if f"remove_option_{idx}_img" in request.form:
-                _delete_file(opt.image_path)
                 opt.image_path = None
 
             # upload mới?
             new_img = save_image(request.files.get(f"option_{idx}_image"))
             if new_img:
-                _delete_file(opt.image_path)
                 opt.image_path = new_img
 
             opt.is_correct = (request.form.get("correct") == str(idx))
@@ -231,6 +419,7 @@ def edit_question(q_id):
                 flash("Each option must have text or image.", "danger")
                 return redirect(request.url)
 
+        bump_exam_version(q.exam_id)
         db.session.commit()
         flash("Question updated", "success")
         return redirect(url_for("admin.edit_exam", exam_id=q.exam.id))
@@ -246,6 +435,7 @@ def delete_question(q_id):
     q = Question.query.get_or_404(q_id)
     exam_id = q.exam.id
     db.session.delete(q)
+    bump_exam_version(exam_id)
     db.session.commit()
     flash("Question deleted", "info")
     return redirect(url_for("admin.edit_exam", exam_id=exam_id))
@@ -258,8 +448,10 @@ def delete_submission(sub_id):
         abort(403)
 
     sub = Submission.query.get_or_404(sub_id)
-    exam_id = sub.exam_id
+    exam_id, user_id = sub.exam_id, sub.user_id
     db.session.delete(sub)
+    db.session.flush()
+    stats.recompute(user_id, exam_id)
     db.session.commit()
 
     flash("Đã xoá bản ghi kết quả.", "info")
@@ -271,9 +463,24 @@ def delete_submission(sub_id):
 def view_submission(sub_id):
     if not current_user.is_admin:
         abort(403)
-    sub = Submission.query.get_or_404(sub_id)
-    answers = SubmissionAnswer.query.filter_by(submission_id=sub.id)\
-                                 .order_by(SubmissionAnswer.question_id).all()
+    sub = (Submission.query
+           .options(joinedload(Submission.user), joinedload(Submission.exam))
+           .filter_by(id=sub_id)
+           .first_or_404())
+
+    # answer + câu hỏi + đáp án đã chọn + đáp án đúng: 1 query
+    selected = aliased(Option)
+    correct  = aliased(Option)
+    answers = (db.session.query(SubmissionAnswer, correct)
+               .join(SubmissionAnswer.question)
+               .outerjoin(selected, SubmissionAnswer.selected)
+               .outerjoin(correct, and_(correct.question_id == Question.id,
+                                        correct.is_correct.is_(True)))
+               .options(contains_eager(SubmissionAnswer.question),
+                        contains_eager(SubmissionAnswer.selected.of_type(selected)))
+               .filter(SubmissionAnswer.submission_id == sub.id)
+               .order_by(Question.order_idx, Question.id)
+               .all())
     return render_template("submission_detail.html",
                            sub=sub, answers=answers)
 
@@ -313,7 +520,33 @@ def list_users():
     if not current_user.is_admin:
         abort(403)
     users = User.query.order_by(User.id).all()
-    return render_template("user_list.html", users=users)
+    classes = Class.query.order_by(Class.name).all()
+    return render_template("user_list.html", users=users, classes=classes)
+
+
+@admin_bp.route("/users/import", methods=["POST"])
+@login_required
+def import_users():
+    if not current_user.is_admin:
+        abort(403)
+
+    upload = request.files.get("users_file")
+    if not upload or upload.filename == "":
+        flash("Chọn file danh sách học sinh (.csv / .json).", "warning")
+        return redirect(url_for("admin.list_users"))
+    fmt = upload.filename.rsplit(".", 1)[-1].lower()
+    class_id = request.form.get("class_id", type=int) or None
+
+    from .. import importer, roster
+    try:
+        results = roster.import_users(fmt, upload.read(), default_class_id=class_id)
+    except importer.ImportFormatError as exc:
+        flash(f"Không nhập được: {exc}", "danger")
+        return redirect(url_for("admin.list_users"))
+
+    created = sum(r.status == "created" for r in results)
+    return render_template("user_import_report.html", filename=upload.filename,
+                           results=results, created=created)
 
 
 @admin_bp.route("/user/<int:uid>/edit", methods=["GET", "POST"])
@@ -356,6 +589,7 @@ def edit_user(uid):
         # ---------- lưu ----------
         db.session.add(user)
         db.session.commit()
+        invalidate_user(user.id)
         flash("Đã lưu tài khoản." if not is_new else "Đã tạo tài khoản.", "success")
         return redirect(url_for("admin.list_users"))
 
@@ -379,6 +613,7 @@ def delete_user(uid):
 
     db.session.delete(user)
     db.session.commit()
+    invalidate_user(uid)
     flash("Đã xoá tài khoản.", "info")
     return redirect(url_for("admin.list_users"))
 
@@ -404,10 +639,43 @@ def move_question(q_id, direction):
 
     # hoán đổi chỉ số
     q.order_idx, neighbor.order_idx = neighbor.order_idx, q.order_idx
+    bump_exam_version(q.exam_id)
     db.session.commit()
     return redirect(url_for("admin.edit_exam", exam_id=q.exam_id))
 
 
+@admin_bp.route("/queue")
+@login_required
+def queue_status():
+    if not current_user.is_admin:
+        abort(403)
+    waiting, claimed, dead = ingest.queue_depth()
+    return jsonify(enabled=ingest.enabled(), depth=waiting, in_progress=claimed,
+                   failed=dead, dead=ingest.dead_entries())
+
+
+@admin_bp.route("/cache")
+@login_required
+def cache_status():
+    if not current_user.is_admin:
+        abort(403)
+    return jsonify(cache_stats())
+
+
+@admin_bp.route("/metrics")
+def metrics_endpoint():
+    # Prometheus không đăng nhập được: cho phép thêm Bearer METRICS_TOKEN
+    token = current_app.config.get("METRICS_TOKEN")
+    bearer = request.headers.get("Authorization", "")
+    if not (token and hmac.compare_digest(bearer, f"Bearer {token}")):
+        if not current_user.is_authenticated:
+            return current_app.login_manager.unauthorized()
+        if not current_user.is_admin:
+            abort(403)
+    return Response(metrics.render_prometheus(),
+                    mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+
 @admin_bp.route("/classes")
 @login_required
 def list_classes():
@@ -433,12 +701,17 @@ def edit_class(cid):
 
         # --- gán học sinh ---
         selected_ids = set(map(int, request.form.getlist("students")))
+        changed = []
         for u in users:
-            u.class_id = classroom.id if u.id in selected_ids else (
+            new_class = classroom.id if u.id in selected_ids else (
                 None if u.class_id == classroom.id else u.class_id)
+            if new_class != u.class_id:
+                u.class_id = new_class
+                changed.append(u.id)
 
         db.session.add(classroom)
         db.session.commit()
+        invalidate_user(*changed)
         flash("Đã lưu lớp." if not is_new else "Đã tạo lớp.", "success")
         return redirect(url_for("admin.list_classes"))
 
@@ -454,10 +727,12 @@ def delete_class(cid):
     if classroom.exams:
         flash("Không xoá được: lớp còn bài thi.", "danger")
         return redirect(url_for("admin.list_classes"))
+    student_ids = [u.id for u in classroom.students]
     for u in classroom.students:      # huỷ liên kết HS
         u.class_id = None
     db.session.delete(classroom)
     db.session.commit()
+    invalidate_user(*student_ids)
     flash("Đã xoá lớp.", "info")
     return redirect(url_for("admin.list_classes"))
 
@@ -472,4 +747,5 @@ def preview_exam(exam_id):
     # dùng lại template take_exam nhưng truyền cờ read_only
     return render_template("take_exam.html",
                            exam=exam,
+                           questions_html=exam_fragment(exam.id, read_only=True),
                            read_only=True)
@@ -0,0 +1,232 @@
+"""Phân tích câu hỏi (item analysis) cho một đề.
+
+Đáp án của mỗi lô bài nộp được nạp thành ma trận NumPy học sinh × câu hỏi
+(đúng/sai và phương án đã chọn) rồi cộng dồn vào các *thống kê đủ*
+(tổng, tổng bình phương, tổng tích...). Từ đó tính trong một lượt vector:
+
+* độ khó p  – tỉ lệ làm đúng từng câu
+* độ phân biệt – point-biserial giữa câu đó và tổng điểm các câu còn lại
+* tỉ lệ chọn từng phương án (kể cả bỏ trống)
+* Cronbach's alpha của cả đề
+
+Bài đã chấm mà không có dòng SubmissionAnswer nào (sweeper chốt lượt chưa
+autosave gì) được tính như bỏ trống mọi câu: sai hết, tổng điểm 0.
+
+Thống kê được cache theo đề (LRU) cùng ``Exam.content_version``; lần sau chỉ
+nạp các bài mới được chấm. Sửa câu hỏi (đổi version trong DB) hoặc xoá bài
+(số bài đã chấm giảm) -> tính lại từ đầu, ở mọi worker.
+"""
+import threading
+
+import numpy as np
+
+from .cache import LRUCache, exam_version
+from .extensions import db
+from .models import Question, Option, Submission, SubmissionAnswer
+
+FETCH_ROWS = 50_000            # số dòng SubmissionAnswer mỗi partition
+
+_stats = LRUCache(maxsize=32)          # exam_id -> _ExamStats
+_lock = threading.Lock()
+
+
+class _ExamStats:
+    """Thống kê đủ của một đề, cộng dồn được."""
+
+    def __init__(self, exam_id, version):
+        self.exam_id = exam_id
+        self.version = version
+
+        rows = (db.session.query(Question.id, Question.text,
+                                 Option.id, Option.text, Option.is_correct)
+                .outerjoin(Option, Option.question_id == Question.id)
+                .filter(Question.exam_id == exam_id)
+                .order_by(Question.order_idx, Question.id, Option.id)
+                .all())
+        self.questions = []                     # [(id, text, [(opt_id, text, ok)])]
+        for q_id, q_text, o_id, o_text, o_ok in rows:
+            if not self.questions or self.questions[-1][0] != q_id:
+                self.questions.append((q_id, q_text, []))
+            if o_id is not None:
+                self.questions[-1][2].append((o_id, o_text, bool(o_ok)))
+
+        k = len(self.questions)
+        self.width = max((len(q[2]) for q in self.questions), default=0)
+        self.q_ids = np.array([q[0] for q in self.questions], dtype=np.int64)
+        self.q_order = np.argsort(self.q_ids)
+        opt = [(o[0], j, i) for j, q in enumerate(self.questions)
+               for i, o in enumerate(q[2])]
+        opt.sort()
+        self.opt_ids = np.array([o[0] for o in opt], dtype=np.int64)
+        self.opt_pos = np.array([o[2] for o in opt], dtype=np.int64)
+
+        # thống kê đủ
+        self.n = 0
+        self.sum_x = np.zeros(k)                # Σ x_j
+        self.sum_xt = np.zeros(k)               # Σ x_j * T
+        self.sum_t = 0.0                        # Σ T
+        self.sum_tt = 0.0                       # Σ T²
+        self.choices = np.zeros((k, self.width + 1), dtype=np.int64)  # cột cuối = bỏ trống
+
+        self.watermark = 0                      # id bài lớn nhất đã quét
+        self.pending = set()                    # bài <= watermark chưa chấm lúc quét
+        self.loaded = 0                         # số bài đã cộng vào n (kể cả bài trống)
+
+    # ---------- nạp dữ liệu ----------
+    def _lookup(self, sorted_ids, order, values):
+        """Vị trí của `values` trong `sorted_ids` (-1 nếu không có)."""
+        if not len(sorted_ids):
+            return np.full(len(values), -1)
+        idx = np.searchsorted(sorted_ids, values)
+        idx = np.clip(idx, 0, len(sorted_ids) - 1)
+        found = sorted_ids[idx] == values
+        return np.where(found, order[idx], -1)
+
+    def fold(self, arr):
+        """Cộng một khối dòng (sub_id, q_id, selected_id, is_correct) – các bài trọn vẹn."""
+        k = len(self.questions)
+        if not len(arr) or not k:
+            return
+        _, row = np.unique(arr[:, 0], return_inverse=True)
+        n_new = int(row.max()) + 1
+        col = self._lookup(self.q_ids[self.q_order], self.q_order, arr[:, 1])
+        keep = col >= 0                          # bỏ đáp án của câu đã xoá
+        row, col, sel, ok = row[keep], col[keep], arr[keep, 2], arr[keep, 3]
+
+        x = np.zeros((n_new, k), dtype=np.int8)
+        x[row, col] = ok
+        choice = np.full((n_new, k), self.width, dtype=np.int64)   # = bỏ trống
+        pos = self._lookup(self.opt_ids, self.opt_pos, sel)
+        choice[row, col] = np.where(pos >= 0, pos, self.width)
+
+        t = x.sum(axis=1, dtype=np.float64)
+        self.n += n_new
+        self.sum_x += x.sum(axis=0)
+        self.sum_xt += x.T @ t
+        self.sum_t += t.sum()
+        self.sum_tt += t @ t
+        flat = np.arange(k) * (self.width + 1) + choice
+        self.choices += np.bincount(flat.ravel(),
+                                    minlength=k * (self.width + 1)
+                                    ).reshape(k, self.width + 1)
+
+    def fold_blank(self, count):
+        """Cộng `count` bài không có đáp án nào: x = 0, T = 0, bỏ trống mọi câu."""
+        if count and len(self.questions):
+            self.n += count
+            self.choices[:, self.width] += count
+
+    def stale(self):
+        """Có bài đã nạp bị xoá (ở worker nào cũng vậy) -> phải tính lại."""
+        if not self.watermark:
+            return False
+        graded = (db.session.query(db.func.count(Submission.id))
+                  .filter(Submission.exam_id == self.exam_id,
+                          Submission.score.is_not(None),
+                          Submission.id <= self.watermark))
+        late = 0                                # bài pending lúc quét, nay đã chấm
+        if self.pending:
+            late = graded.filter(Submission.id.in_(self.pending)).scalar()
+        return graded.scalar() - late < self.loaded
+
+    def refresh(self):
+        """Nạp các bài mới chấm kể từ lần trước."""
+        new_subs = db.or_(Submission.id > self.watermark,
+                          Submission.id.in_(self.pending))
+        top = (db.session.query(db.func.max(Submission.id))
+               .filter(Submission.exam_id == self.exam_id).scalar()) or 0
+
+        stmt = (db.select(SubmissionAnswer.submission_id,
+                          SubmissionAnswer.question_id,
+                          db.func.coalesce(SubmissionAnswer.selected_id, -1),
+                          db.cast(SubmissionAnswer.is_correct, db.Integer))
+                .join(Submission, Submission.id == SubmissionAnswer.submission_id)
+                .where(Submission.exam_id == self.exam_id,
+                       Submission.score.is_not(None),
+                       Submission.id <= top,
+                       new_subs)
+                .order_by(SubmissionAnswer.submission_id)
+                .execution_options(yield_per=FETCH_ROWS))
+
+        # chụp danh sách bài đang làm TRƯỚC khi nạp đáp án: bài được chấm
+        # giữa hai bước sẽ được nạp ngay bây giờ hoặc ở lần sau, không mất
+        snapshot = {sid for (sid,) in db.session.query(Submission.id)
+                    .filter(Submission.exam_id == self.exam_id,
+                            Submission.score.is_(None),
+                            Submission.id <= top)}
+        graded = {sid for (sid,) in db.session.query(Submission.id)
+                  .filter(Submission.exam_id == self.exam_id,
+                          Submission.score.is_not(None),
+                          Submission.id <= top, new_subs)}
+
+        loaded = set()
+        carry = np.empty((0, 4), dtype=np.int64)
+        for part in db.session.execute(stmt).partitions():
+            arr = np.vstack([carry, np.array(part, dtype=np.int64)])
+            # giữ lại bài cuối (có thể còn dòng ở partition sau)
+            split = np.searchsorted(arr[:, 0], arr[-1, 0])
+            self.fold(arr[:split])
+            loaded.update(np.unique(arr[:split, 0]).tolist())
+            carry = arr[split:]
+        self.fold(carry)
+        loaded.update(np.unique(carry[:, 0]).tolist())
+        blank = graded - loaded
+        self.fold_blank(len(blank))
+        loaded |= blank
+
+        self.loaded += len(loaded)
+        self.pending = snapshot - loaded
+        self.watermark = top
+
+    # ---------- kết quả ----------
+    def report(self):
+        k, n = len(self.questions), self.n
+        out = {"exam_id": self.exam_id, "n_students": n, "n_questions": k,
+               "alpha": None, "questions": []}
+        if not k:
+            return out
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            p = self.sum_x / n if n else np.full(k, np.nan)
+            var_x = p * (1 - p)                               # x nhị phân
+            mean_t = self.sum_t / n if n else np.nan
+            var_t = self.sum_tt / n - mean_t ** 2 if n else np.nan
+            cov_xt = self.sum_xt / n - p * mean_t if n else np.full(k, np.nan)
+            # item-rest: R = T - x
+            cov_xr = cov_xt - var_x
+            var_r = var_t + var_x - 2 * cov_xt
+            r_pb = cov_xr / np.sqrt(var_x * var_r)
+            rates = self.choices / n if n else np.zeros_like(self.choices, float)
+            if k > 1 and n > 1 and var_t > 0:
+                out["alpha"] = _num(k / (k - 1) * (1 - var_x.sum() / var_t))
+
+        for j, (q_id, q_text, options) in enumerate(self.questions):
+            out["questions"].append({
+                "id": q_id,
+                "number": j + 1,
+                "text": q_text,
+                "difficulty": _num(p[j]),
+                "discrimination": _num(r_pb[j]),
+                "omit_rate": _num(rates[j, self.width]),
+                "options": [{"id": o_id, "label": chr(65 + i), "text": o_text,
+                             "is_correct": o_ok, "rate": _num(rates[j, i])}
+                            for i, (o_id, o_text, o_ok) in enumerate(options)],
+            })
+        return out
+
+
+def _num(value):
+    value = float(value)
+    return None if np.isnan(value) or np.isinf(value) else round(value, 4)
+
+
+def item_analysis(exam_id):
+    """Báo cáo item analysis (dict, sẵn sàng jsonify) – cập nhật tăng dần."""
+    with _lock:
+        version = exam_version(exam_id)
+        stats = _stats.get(exam_id)
+        if stats is None or stats.version != version or stats.stale():
+            stats = _ExamStats(exam_id, version)
+            _stats.set(exam_id, stats)
+        stats.refresh()
+        return stats.report()
@@ -0,0 +1,196 @@
+"""Phục vụ file tĩnh: URL có dấu vân tay, cache vĩnh viễn, bản nén sẵn.
+
+* ``url_for('static', filename='timer.js')`` -> ``/static/timer.<hash12>.js``.
+  Ảnh trong ``uploads/`` đã đặt tên theo sha256 (app/uploads.py) nên giữ nguyên.
+* URL có hash (hoặc ảnh uploads/<sha256>) trả ``Cache-Control: immutable``
+  một năm: lần thi sau trình duyệt không gửi request nào cho file tĩnh.
+  URL không hash (link cũ, hash đã cũ) vẫn phục vụ, nhưng ``no-cache`` + ETag.
+* File dạng text (js, css, svg...) được nén sẵn bằng ``flask assets compress``
+  (chạy mỗi lần deploy) thành ``<file>.gz`` và ``<file>.br`` (cần
+  ``pip install brotli``); chọn theo Accept-Encoding, bản nén cũ hơn file gốc
+  bị bỏ qua.
+* Gửi file bằng ``send_file`` (wsgi.file_wrapper / sendfile của server), hoặc
+  nhường cho reverse proxy: ``STATIC_SENDFILE = "x-sendfile"`` (Apache,
+  lighttpd) hay ``"x-accel-redirect"`` (Nginx, location ``internal`` tại
+  ``STATIC_ACCEL_PREFIX``).
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+
+from flask import abort, current_app, request
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+COMPRESSIBLE = {".js", ".css", ".svg", ".html", ".txt", ".json", ".map"}
+MIN_COMPRESS_SIZE = 256          # file nhỏ hơn: nén không bõ
+HASH_LEN = 12
+
+# ảnh upload: uploads/<sha256>.<ext> hoặc biến thể uploads/<sha256>.<variant>.webp
+_CONTENT_ADDRESSED = re.compile(r"^uploads/[0-9a-f]{64}(\.\w+)?\.\w+$")
+_FINGERPRINTED = re.compile(rf"^(.+)\.([0-9a-f]{{{HASH_LEN}}})(\.[^./]+)$")
+
+_digests = {}                    # đường dẫn tuyệt đối -> (mtime_ns, size, hash)
+_lock = threading.Lock()
+
+
+# ---------- dấu vân tay ----------
+def _digest(path):
+    st = os.stat(path)
+    cached = _digests.get(path)
+    if cached and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return cached[2]
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 16), b""):
+            h.update(chunk)
+    digest = h.hexdigest()[:HASH_LEN]
+    with _lock:
+        _digests[path] = (st.st_mtime_ns, st.st_size, digest)
+    return digest
+
+
+def fingerprint(filename):
+    """`timer.js` -> `timer.<hash>.js`; ảnh uploads/ và file không tồn tại giữ nguyên."""
+    if not filename or _CONTENT_ADDRESSED.match(filename):
+        return filename
+    path = safe_join(current_app.static_folder, filename)
+    if path is None:
+        return filename
+    try:
+        digest = _digest(path)
+    except OSError:
+        return filename
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}.{digest}{ext}"
+
+
+def _url_defaults(endpoint, values):
+    if endpoint == "static" and "filename" in values:
+        values["filename"] = fingerprint(values["filename"])
+
+
+def _resolve(filename):
+    """URL -> (tên file thật, ETag nếu được cache vĩnh viễn / None)."""
+    if _CONTENT_ADDRESSED.match(filename):
+        return filename, os.path.basename(filename).split(".")[0]
+    m = _FINGERPRINTED.match(filename)
+    if m:
+        real = m.group(1) + m.group(3)
+        path = safe_join(current_app.static_folder, real)
+        if path and os.path.isfile(path):
+            # hash cũ (file đã đổi): trả nội dung mới nhưng không cho cache mãi
+            return real, m.group(2) if _digest(path) == m.group(2) else None
+    return filename, None
+
+
+# ---------- nén sẵn ----------
+def _compressors():
+    out = [(".gz", "gzip", lambda data: gzip.compress(data, 9, mtime=0))]
+    try:
+        import brotli                    # tuỳ chọn: pip install brotli
+    except ImportError:
+        return out
+    return [(".br", "br", lambda data: brotli.compress(data, quality=11))] + out
+
+
+def precompress_file(path):
+    """Ghi `<path>.gz` / `<path>.br` nếu file nén được và bản nén đã cũ."""
+    if os.path.splitext(path)[1].lower() not in COMPRESSIBLE:
+        return
+    st = os.stat(path)
+    if st.st_size < MIN_COMPRESS_SIZE:
+        return
+    data = None
+    for suffix, _, compress in _compressors():
+        target = path + suffix
+        try:
+            if os.stat(target).st_mtime_ns >= st.st_mtime_ns:
+                continue
+        except OSError:
+            pass
+        if data is None:
+            with open(path, "rb") as fh:
+                data = fh.read()
+        packed = compress(data)
+        if len(packed) >= len(data):
+            continue
+        tmp = f"{target}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as fh:
+            fh.write(packed)
+        os.replace(tmp, target)
+
+
+def precompress(folder):
+    """Nén sẵn mọi file text trong static/ (bỏ qua uploads/ – toàn ảnh)."""
+    for root, dirs, files in os.walk(folder):
+        if root == folder and "uploads" in dirs:
+            dirs.remove("uploads")
+        for name in files:
+            try:
+                precompress_file(os.path.join(root, name))
+            except OSError as exc:
+                current_app.logger.warning("không nén được %s: %s", name, exc)
+
+
+def _pick_encoding(path):
+    """(đường dẫn file sẽ gửi, Content-Encoding hoặc None) theo Accept-Encoding."""
+    if os.path.splitext(path)[1].lower() not in COMPRESSIBLE:
+        return path, None
+    accepted = request.accept_encodings
+    mtime = os.stat(path).st_mtime_ns
+    for suffix, encoding, _ in _compressors():
+        if not accepted[encoding]:
+            continue
+        try:
+            if os.stat(path + suffix).st_mtime_ns >= mtime:
+                return path + suffix, encoding
+        except OSError:
+            continue
+    return path, None
+
+
+# ---------- view ----------
+def serve_static(filename):
+    static = current_app.static_folder
+    real, tag = _resolve(filename)
+    path = safe_join(static, real)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    send_path, encoding = _pick_encoding(path)
+    mimetype = mimetypes.guess_type(real)[0] or "application/octet-stream"
+    mode = current_app.config.get("STATIC_SENDFILE")
+
+    if mode == "x-accel-redirect":
+        response = current_app.response_class(mimetype=mimetype)
+        prefix = current_app.config.get("STATIC_ACCEL_PREFIX", "/_static/")
+        response.headers["X-Accel-Redirect"] = (
+            prefix.rstrip("/") + "/" + os.path.relpath(send_path, static).replace(os.sep, "/"))
+    else:
+        etag = True                      # mặc định: mtime + size của file gửi đi
+        if tag:
+            etag = tag + (f"-{encoding}" if encoding else "")
+        response = send_file(send_path, request.environ, mimetype=mimetype,
+                             download_name=os.path.basename(real),
+                             conditional=True, etag=etag, max_age=None,
+                             use_x_sendfile=(mode == "x-sendfile"),
+                             response_class=current_app.response_class)
+
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    if os.path.splitext(path)[1].lower() in COMPRESSIBLE:
+        response.vary.add("Accept-Encoding")
+    response.headers["Cache-Control"] = IMMUTABLE if tag else REVALIDATE
+    return response
+
+
+def init_app(app):
+    app.url_defaults(_url_defaults)
+    if "static" in app.view_functions:
+        app.view_functions["static"] = serve_static
@@ -6,10 +6,6 @@ from ..extensions import db, login_manager
 
 auth_bp = Blueprint("auth", __name__)
 
-@login_manager.user_loader
-def load_user(uid):
-    return User.query.get(int(uid))
-
 @login_manager.unauthorized_handler
 def _redirect_login():
     return redirect(url_for("auth.login", next=request.path))
@@ -0,0 +1,194 @@
+"""Lưu nháp đáp án trong lúc làm bài.
+
+take_exam gửi các thay đổi nhỏ ``{question_id: option_id}`` (debounce phía
+client) tới ``/exam/<id>/autosave``. Server chỉ gom chúng vào buffer trong
+bộ nhớ; một thread nền ghi cả buffer mỗi ``AUTOSAVE_FLUSH_SECONDS`` giây
+trong một transaction (DELETE + INSERT executemany) vào SubmissionAnswer của
+lượt đang làm. Tải ghi vì vậy trải đều trong giờ thi thay vì dồn vào giây cuối.
+Thread (và hook atexit) chỉ khởi động ở request đầu tiên của worker web
+(app/background.py). ``AUTOSAVE_FLUSH_SECONDS = 0``, hoặc khi không có thread
+(lệnh CLI, test): mỗi request autosave tự ghi ngay.
+
+Buffer nằm trong từng process: resume / sweeper ở worker khác chỉ thấy phần đã
+ghi xuống DB, tức có thể chậm tối đa một chu kỳ flush.
+
+Khi nộp / huỷ / worker hàng đợi chấm: đáp án cuối = đáp án đã lưu, ghi đè bởi
+form; chỉ các dòng khác với bản đã lưu mới được ghi.
+
+Thứ tự khoá: mọi bên ghi đều UPDATE dòng Submission (``WHERE score IS NULL``)
+*trước* khi đụng tới đáp án. Nộp bài claim lượt thi bằng UPDATE đó, nên một lần
+flush chạy song song hoặc chờ tới khi nộp xong rồi bỏ qua lượt đó, hoặc xong
+trước và bị bản nộp ghi đè.
+"""
+import atexit
+import threading
+from datetime import datetime
+
+from sqlalchemy import bindparam, insert, select, update
+
+from .extensions import db
+
+_buffer = {}                   # submission_id -> (exam_id, {question_id: option_id})
+_lock = threading.Lock()
+_wakeup = threading.Event()
+_flusher = None
+
+
+# ---------- phía request ----------
+def record(sub_id, exam_id, deltas, max_pending=None):
+    """Gom thay đổi của một lượt thi vào buffer (bản mới đè bản cũ)."""
+    with _lock:
+        _, answers = _buffer.setdefault(sub_id, (exam_id, {}))
+        answers.update(deltas)
+        full = max_pending is not None and len(_buffer) >= max_pending
+    if full:
+        _wakeup.set()
+
+
+def discard(sub_id):
+    """Bỏ phần nháp chưa ghi của lượt (lượt sắp được chấm từ form đầy đủ)."""
+    with _lock:
+        entry = _buffer.pop(sub_id, None)
+    return entry[1] if entry else {}
+
+
+def saved_answers(sub_id):
+    """{question_id: option_id} đã lưu (DB + buffer của process này) – để điền lại khi resume.
+
+    Nháp còn trong buffer của worker *khác* chưa có ở đây (chậm tối đa
+    ``AUTOSAVE_FLUSH_SECONDS``).
+    """
+    from .models import SubmissionAnswer
+    saved = dict(db.session.execute(
+        select(SubmissionAnswer.question_id, SubmissionAnswer.selected_id)
+        .where(SubmissionAnswer.submission_id == sub_id,
+               SubmissionAnswer.selected_id.is_not(None))).all())
+    with _lock:
+        entry = _buffer.get(sub_id)
+        if entry:
+            saved.update(entry[1])
+    return saved
+
+
+# ---------- ghi ----------
+def write_answers(rows, replaced=()):
+    """Xoá các cặp (submission_id, question_id) trong `replaced`, rồi insert `rows`."""
+    from .models import SubmissionAnswer
+    table = SubmissionAnswer.__table__
+    if replaced:
+        db.session.execute(
+            table.delete().where(table.c.submission_id == bindparam("b_sub"),
+                                 table.c.question_id == bindparam("b_q")),
+            [{"b_sub": s, "b_q": q} for s, q in replaced])
+    if rows:
+        db.session.execute(insert(SubmissionAnswer), rows)     # executemany
+
+
+def final_answers(sub_id, key, form):
+    """Chấm lượt thi từ đáp án đã lưu + form. -> (số câu đúng, rows cần ghi, cặp cần xoá).
+
+    Gọi sau khi đã claim Submission trong transaction hiện tại.
+    """
+    from .cache import grade
+    from .models import SubmissionAnswer
+
+    saved = {q: (sel, bool(ok)) for q, sel, ok in db.session.execute(
+        select(SubmissionAnswer.question_id, SubmissionAnswer.selected_id,
+               SubmissionAnswer.is_correct)
+        .where(SubmissionAnswer.submission_id == sub_id))}
+    merged = {f"question_{q}": str(sel) for q, (sel, _) in saved.items() if sel}
+    merged.update((k, v) for k, v in form.items() if k.startswith("question_") and v)
+
+    correct, answers = grade(key, merged, submission_id=sub_id)
+    changed = [a for a in answers
+               if saved.get(a["question_id"]) != (a["selected_id"], a["is_correct"])]
+    replaced = [(sub_id, a["question_id"]) for a in changed if a["question_id"] in saved]
+    return correct, changed, replaced
+
+
+def flush():
+    """Ghi buffer vào DB trong một transaction. -> số lượt thi đã ghi."""
+    global _buffer
+    from .cache import get_answer_key
+    from .models import Submission
+
+    with _lock:
+        pending, _buffer = _buffer, {}
+    if not pending:
+        return 0
+
+    try:
+        # chạm dòng Submission trước (khoá), rồi mới đọc lượt nào còn pending
+        table = Submission.__table__
+        db.session.execute(
+            update(table)
+            .where(table.c.id == bindparam("b_id"), table.c.score.is_(None))
+            .values(saved_at=datetime.utcnow()),
+            [{"b_id": sub_id} for sub_id in pending])
+        live = set(db.session.scalars(
+            select(Submission.id).where(Submission.id.in_(list(pending)),
+                                        Submission.score.is_(None))))
+
+        rows, replaced = [], []
+        for sub_id in live:
+            exam_id, answers = pending[sub_id]
+            key = get_answer_key(exam_id)
+            for q_id, opt_id in answers.items():
+                if opt_id not in key.valid.get(q_id, ()):
+                    continue                       # câu đã xoá / option lạ
+                rows.append({"submission_id": sub_id, "question_id": q_id,
+                             "selected_id": opt_id,
+                             "is_correct": key.correct.get(q_id) == opt_id})
+                replaced.append((sub_id, q_id))
+        write_answers(rows, replaced)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        with _lock:                                # trả lại buffer, lần sau thử lại
+            for sub_id, (exam_id, answers) in pending.items():
+                newer = _buffer.get(sub_id, (exam_id, {}))[1]
+                _buffer[sub_id] = (exam_id, {**answers, **newer})
+        raise
+    return len(live)
+
+
+def _flush_loop(app, interval):
+    while True:
+        _wakeup.wait(timeout=interval)
+        _wakeup.clear()
+        with app.app_context():
+            try:
+                flush()
+            except Exception:
+                app.logger.exception("autosave flush error")
+            finally:
+                db.session.remove()
+
+
+def _flush_at_exit(app):
+    with app.app_context():
+        try:
+            flush()
+        except Exception:
+            pass
+
+
+def write_through():
+    """True khi không có thread flush: request autosave phải tự ghi."""
+    return _flusher is None
+
+
+def _start_flusher(app):
+    global _flusher
+    if _flusher is None:
+        interval = app.config["AUTOSAVE_FLUSH_SECONDS"]
+        _flusher = threading.Thread(target=_flush_loop, args=(app, interval),
+                                    name="autosave-flush", daemon=True)
+        _flusher.start()
+        atexit.register(_flush_at_exit, app)
+
+
+def init_app(app):
+    from . import background
+    if app.config.get("AUTOSAVE_FLUSH_SECONDS", 5):
+        background.register(app, _start_flusher)
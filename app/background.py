@@ -0,0 +1,41 @@
+"""Thread nền của worker web, khởi động ở request đầu tiên.
+
+create_app chạy cả trong ``flask db init``, ``flask exams sweep``... và trong
+test. Những chỗ đó không cần thread flush autosave, sweeper, worker hàng đợi
+nộp bài, dọn session hay hook atexit. Mỗi module đăng ký hàm khởi động bằng
+:func:`register`; chúng chỉ chạy khi process phục vụ request đầu tiên và
+``BACKGROUND_THREADS`` cho phép (mặc định: bật, trừ khi ``app.testing``).
+"""
+import threading
+
+from flask import current_app
+
+_lock = threading.Lock()
+
+
+def enabled(app):
+    flag = app.config.get("BACKGROUND_THREADS")
+    return not app.testing if flag is None else bool(flag)
+
+
+def register(app, start):
+    """`start(app)` sẽ được gọi một lần, ở request đầu tiên."""
+    app.extensions.setdefault("background", []).append(start)
+
+
+def _start_once():
+    app = current_app._get_current_object()
+    if app.extensions.get("background_started"):
+        return
+    with _lock:
+        if app.extensions.get("background_started"):
+            return
+        app.extensions["background_started"] = True
+        if not enabled(app):
+            return
+        for start in app.extensions.get("background", []):
+            start(app)
+
+
+def init_app(app):
+    app.before_request(_start_once)
@@ -0,0 +1,249 @@
+"""In-process caches cho các đường nóng (chấm bài, render đề...).
+
+Mỗi worker giữ cache riêng; dữ liệu đề thi được gắn với ``Exam.content_version``
+(cột trong DB, tăng cùng transaction với mỗi lần sửa câu hỏi) nên mọi worker
+đều thấy version mới và entry cũ tự bị bỏ qua.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from flask_login import UserMixin
+
+from .extensions import db
+
+
+class LRUCache:
+    """Cache LRU có giới hạn kích thước, an toàn với nhiều thread.
+
+    `ttl` (giây) tuỳ chọn: entry quá hạn coi như miss – hữu ích khi nhiều
+    worker process cùng chạy và không thể báo nhau invalidate.
+    """
+
+    def __init__(self, maxsize=256, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"size": len(self), "maxsize": self.maxsize,
+                "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else None}
+
+
+# ---------- version nội dung đề thi ----------
+def exam_version(exam_id):
+    """``Exam.content_version`` hiện tại – một SELECT theo khoá chính."""
+    from .models import Exam
+    return db.session.execute(
+        db.select(Exam.content_version).where(Exam.id == exam_id)).scalar() or 0
+
+
+def bump_exam_version(exam_id):
+    """Gọi *trước* commit khi thêm/sửa/xoá/đổi thứ tự câu hỏi của một đề.
+
+    Chỉ UPDATE trong session hiện tại: version mới hiện ra cùng lúc với nội
+    dung mới, ở mọi worker.
+    """
+    from .models import Exam
+    db.session.execute(
+        db.update(Exam).where(Exam.id == exam_id)
+        .values(content_version=Exam.content_version + 1),
+        execution_options={"synchronize_session": False})
+
+
+# ---------- answer key ----------
+class AnswerKey(NamedTuple):
+    version: int
+    question_ids: tuple          # theo order_idx
+    correct: dict                # question_id -> option_id đúng
+    valid: dict                  # question_id -> frozenset option_id
+
+
+_answer_keys = LRUCache(maxsize=512, ttl=600)    # ttl: phòng khi DB bị sửa tay
+
+
+def _build_answer_key(exam_id, version):
+    from .models import Question, Option
+
+    rows = (db.session.query(Question.id, Option.id, Option.is_correct)
+            .outerjoin(Option, Option.question_id == Question.id)
+            .filter(Question.exam_id == exam_id)
+            .order_by(Question.order_idx, Question.id)
+            .all())
+
+    question_ids, correct, valid = [], {}, {}
+    for q_id, opt_id, is_correct in rows:
+        if q_id not in valid:
+            question_ids.append(q_id)
+            valid[q_id] = set()
+        if opt_id is None:
+            continue
+        valid[q_id].add(opt_id)
+        if is_correct:
+            correct[q_id] = opt_id
+
+    return AnswerKey(version=version,
+                     question_ids=tuple(question_ids),
+                     correct=correct,
+                     valid={q: frozenset(s) for q, s in valid.items()})
+
+
+def get_answer_key(exam_id):
+    version = exam_version(exam_id)
+    key = _answer_keys.get(exam_id)
+    if key is None or key.version != version:
+        key = _build_answer_key(exam_id, version)
+        _answer_keys.set(exam_id, key)
+    return key
+
+
+def grade(key, form, submission_id=None):
+    """Chấm bài từ form `question_<id>` -> (số câu đúng, list đáp án).
+
+    Mỗi đáp án là dict sẵn cho bulk insert SubmissionAnswer.
+    Option id không thuộc câu hỏi (hoặc không phải số) bị coi như bỏ trống.
+    """
+    correct = 0
+    answers = []
+    for q_id in key.question_ids:
+        chosen = form.get(f"question_{q_id}")
+        try:
+            chosen = int(chosen) if chosen else None
+        except ValueError:
+            chosen = None
+        if chosen not in key.valid[q_id]:
+            chosen = None
+
+        is_correct = chosen is not None and key.correct.get(q_id) == chosen
+        correct += is_correct
+        answers.append({"submission_id": submission_id,
+                        "question_id": q_id,
+                        "selected_id": chosen,
+                        "is_correct": is_correct})
+    return correct, answers
+
+
+# ---------- fragment HTML phần câu hỏi của take_exam ----------
+_exam_fragments = LRUCache(maxsize=128)
+
+
+def exam_fragment(exam_id, read_only=False):
+    """HTML danh sách câu hỏi/đáp án, giống nhau cho mọi thí sinh.
+
+    Key gồm ``Exam.content_version`` nên bản cũ tự rơi khỏi LRU ở mọi worker
+    sau khi admin sửa đề, hoặc khi biến thể ảnh của đề được tạo xong
+    (app/images.py tăng version).
+    """
+    key = (exam_id, exam_version(exam_id), read_only)
+    html = _exam_fragments.get(key)
+    if html is None:
+        html = _render_exam_fragment(exam_id, read_only)
+        _exam_fragments.set(key, html)
+    return html
+
+
+def _render_exam_fragment(exam_id, read_only):
+    from flask import render_template
+    from sqlalchemy.orm import selectinload
+    from .models import Question
+
+    questions = (Question.query
+                 .filter_by(exam_id=exam_id)
+                 .options(selectinload(Question.options))
+                 .order_by(Question.order_idx, Question.id)
+                 .all())
+    return render_template("_exam_questions.html",
+                           questions=questions, read_only=read_only)
+
+
+# ---------- user đang đăng nhập ----------
+class CachedUser(UserMixin):
+    """current_user nhẹ: chỉ các cột route cần, không gắn với session ORM."""
+
+    def __init__(self, id, username, is_admin, class_id):
+        self.id = id
+        self.username = username
+        self.is_admin = is_admin
+        self.class_id = class_id
+
+    def __repr__(self):
+        return f"<CachedUser {self.id} {self.username!r}>"
+
+
+# TTL ngắn: worker khác không nhận được invalidate (xoá user, đổi quyền)
+_users = LRUCache(maxsize=4096, ttl=30)
+
+
+def load_user(user_id):
+    """user_loader của Flask-Login – mỗi request đã đăng nhập gọi một lần."""
+    from .models import User
+
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    user = _users.get(user_id)
+    if user is None:
+        row = (db.session.query(User.id, User.username, User.is_admin, User.class_id)
+               .filter(User.id == user_id).first())
+        if row is None:
+            return None                  # không cache: tránh giữ id đã xoá
+        user = CachedUser(row.id, row.username, bool(row.is_admin), row.class_id)
+        _users.set(user_id, user)
+    return user
+
+
+def invalidate_user(*user_ids):
+    """Gọi khi username / quyền / lớp của user đổi, hoặc user bị xoá."""
+    for user_id in user_ids:
+        _users.pop(user_id)
+
+
+def cache_stats():
+    """Kích thước + hit/miss của các cache trong process này."""
+    from .utils import _md_cache
+    return {"users": _users.stats(),
+            "answer_keys": _answer_keys.stats(),
+            "exam_fragments": _exam_fragments.stats(),
+            "markdown": _md_cache.stats()}
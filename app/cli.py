@@ -0,0 +1,187 @@
+"""Lệnh `flask ...` cho vận hành.
+
+Module của từng lệnh chỉ được import khi lệnh chạy: create_app (gồm cả worker
+web) không phải nạp importer, roster... chỉ để đăng ký lệnh.
+"""
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+db_cli = AppGroup("db", help="Schema / migration.")
+
+
+@db_cli.command("init")
+def db_init():
+    """Tạo bảng còn thiếu và áp dụng migration (chạy một lần khi deploy)."""
+    from . import migrations
+    from .extensions import db
+    db.create_all()
+    applied = migrations.upgrade()
+    click.echo(f"Schema sẵn sàng ({len(applied)} migration vừa áp dụng).")
+
+
+@db_cli.command("upgrade")
+def db_upgrade():
+    """Áp dụng các migration còn thiếu."""
+    from . import migrations
+    applied = migrations.upgrade()
+    click.echo("\n".join(applied) if applied else "Schema đã mới nhất.")
+
+
+@db_cli.command("explain")
+def db_explain():
+    """Kiểm tra các query nóng có dùng index (EXPLAIN)."""
+    from . import migrations
+    ok = True
+    for name, plan, uses_index in migrations.explain_hot_queries():
+        ok &= uses_index
+        click.echo(f"[{'OK ' if uses_index else 'BAD'}] {name}")
+        for line in plan:
+            click.echo(f"      {line}")
+    if not ok:
+        raise SystemExit(1)
+
+
+@db_cli.command("rebuild-stats")
+def db_rebuild_stats():
+    """Dựng lại bảng user_exam_stats từ Submission."""
+    from . import stats
+    click.echo(f"Đã dựng {stats.rebuild()} dòng (user, đề).")
+
+
+uploads_cli = AppGroup("uploads", help="Kho ảnh upload.")
+
+
+@uploads_cli.command("gc")
+@click.option("--dry-run", is_flag=True, help="Chỉ liệt kê, không xoá.")
+def uploads_gc(dry_run):
+    """Xoá ảnh (và biến thể) không còn câu hỏi / đáp án nào dùng."""
+    from . import uploads
+    count, size = uploads.collect_garbage(dry_run=dry_run)
+    verb = "Sẽ xoá" if dry_run else "Đã xoá"
+    click.echo(f"{verb} {count} file ({size / 1024:.1f} KiB).")
+
+
+users_cli = AppGroup("users", help="Tài khoản.")
+
+
+@users_cli.command("import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--class", "class_name", help="Lớp mặc định cho dòng không ghi lớp.")
+@click.option("--workers", type=int, help="Số process hash mật khẩu (mặc định: số CPU).")
+@click.option("--report", type=click.File("w", encoding="utf-8"),
+              help="Ghi báo cáo từng dòng (CSV, gồm mật khẩu sinh tự động).")
+def users_import(path, class_name, workers, report):
+    """Tạo tài khoản học sinh hàng loạt từ CSV / JSON."""
+    from . import roster
+    from .importer import ImportFormatError
+    from .models import Class
+    class_id = None
+    if class_name:
+        classroom = Class.query.filter_by(name=class_name).first()
+        if classroom is None:
+            raise click.BadParameter(f"không có lớp {class_name!r}", param_hint="--class")
+        class_id = classroom.id
+
+    with open(path, "rb") as fh:
+        data = fh.read()
+    try:
+        results = roster.import_users(path.rsplit(".", 1)[-1].lower(), data,
+                                      default_class_id=class_id, workers=workers)
+    except ImportFormatError as exc:
+        raise click.ClickException(str(exc))
+
+    if report:
+        roster.write_report(results, report)
+    errors = [r for r in results if r.status != "created"]
+    for r in errors:
+        click.echo(f"dòng {r.line} ({r.username or '-'}): {r.message}", err=True)
+    click.echo(f"Đã tạo {len(results) - len(errors)} / {len(results)} tài khoản.")
+    if errors:
+        raise SystemExit(1)
+
+
+@users_cli.command("create-admin")
+@click.argument("username")
+@click.password_option(help="Mật khẩu (bỏ trống để nhập ẩn).")
+def users_create_admin(username, password):
+    """Tạo tài khoản admin."""
+    from werkzeug.security import generate_password_hash
+    from .extensions import db
+    from .models import User
+    if User.query.filter_by(username=username).first():
+        raise click.ClickException(f"username {username!r} đã tồn tại")
+    db.session.add(User(username=username, is_admin=True,
+                        password_hash=generate_password_hash(password)))
+    db.session.commit()
+    click.echo(f"Đã tạo admin {username}.")
+
+
+sessions_cli = AppGroup("sessions", help="Session phía server.")
+
+
+@sessions_cli.command("cleanup")
+def sessions_cleanup():
+    """Xoá các session đã hết hạn khỏi store."""
+    from . import sessions
+    store = sessions.store_for(current_app)
+    if store is None:
+        raise click.ClickException("SESSION_BACKEND = cookie: không có store để dọn.")
+    click.echo(f"Đã xoá {store.cleanup()} session hết hạn.")
+
+
+exams_cli = AppGroup("exams", help="Lượt thi.")
+
+
+@exams_cli.command("sweep")
+def exams_sweep():
+    """Chốt các lượt đã quá giờ mà chưa nộp (chấm từ đáp án đã lưu)."""
+    from . import sweeper
+    click.echo(f"Đã chốt {sweeper.sweep()} lượt quá giờ.")
+
+
+queue_cli = AppGroup("queue", help="Hàng đợi nộp bài (SUBMIT_QUEUE).")
+
+
+def _queue_enabled():
+    from . import ingest
+    if not ingest.enabled():
+        raise click.ClickException("SUBMIT_QUEUE chưa bật: không có hàng đợi.")
+    return ingest
+
+
+@queue_cli.command("retry")
+@click.argument("entry_ids", nargs=-1, type=int)
+def queue_retry(entry_ids):
+    """Cho entry chết (mặc định: tất cả) chấm lại từ đầu."""
+    ingest = _queue_enabled()
+    click.echo(f"Đã đưa {ingest.retry_dead(entry_ids)} entry về hàng đợi.")
+
+
+@queue_cli.command("drop")
+@click.argument("entry_ids", nargs=-1, type=int)
+def queue_drop(entry_ids):
+    """Xoá entry chết (mặc định: tất cả); lượt thi được sweeper chốt từ autosave."""
+    ingest = _queue_enabled()
+    click.echo(f"Đã xoá {ingest.drop_dead(entry_ids)} entry.")
+
+
+assets_cli = AppGroup("assets", help="File tĩnh.")
+
+
+@assets_cli.command("compress")
+def assets_compress():
+    """Nén sẵn file text trong static/ (.gz, .br) – chạy mỗi lần deploy."""
+    from . import assets
+    assets.precompress(current_app.static_folder)
+    click.echo("Đã nén sẵn file tĩnh.")
+
+
+def init_app(app):
+    app.cli.add_command(db_cli)
+    app.cli.add_command(uploads_cli)
+    app.cli.add_command(users_cli)
+    app.cli.add_command(sessions_cli)
+    app.cli.add_command(exams_cli)
+    app.cli.add_command(queue_cli)
+    app.cli.add_command(assets_cli)
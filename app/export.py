@@ -0,0 +1,135 @@
+"""Xuất kết quả thi dạng CSV / XLSX, bộ nhớ không đổi theo số dòng.
+
+Mỗi đề chỉ chạy một query stream (yield_per) đã sắp theo submission id,
+gom đáp án của từng bài bằng groupby rồi sinh ra một dòng.
+"""
+import csv
+import io
+import string
+from itertools import groupby
+
+from .extensions import db
+from .models import (Exam, Question, Option, Submission, SubmissionAnswer,
+                     User, Class, elapsed_seconds)
+
+CHUNK_ROWS = 500           # số dòng CSV gom lại trước khi yield
+FETCH_ROWS = 2000          # yield_per của cursor
+
+BASE_HEADER = ["username", "class", "score", "started", "ended", "elapsed_s"]
+
+
+def _question_layout(exam_id):
+    """[question_id theo thứ tự], {option_id: chữ cái A/B/C...}"""
+    rows = (db.session.query(Question.id, Option.id)
+            .outerjoin(Option, Option.question_id == Question.id)
+            .filter(Question.exam_id == exam_id)
+            .order_by(Question.order_idx, Question.id, Option.id)
+            .all())
+    question_ids, letters = [], {}
+    for q_id, rows_q in groupby(rows, key=lambda r: r[0]):
+        question_ids.append(q_id)
+        for idx, (_, opt_id) in enumerate(rows_q):
+            if opt_id is not None:
+                letters[opt_id] = string.ascii_uppercase[idx % 26]
+    return question_ids, letters
+
+
+def _fmt(dt):
+    return dt.isoformat(sep=" ", timespec="seconds") if dt else ""
+
+
+def exam_rows(exam, width=None, prefix=()):
+    """Sinh từng dòng kết quả của một đề (list giá trị).
+
+    `width` = số câu cần chừa cột (cho file nhiều đề), mặc định = số câu của đề.
+    """
+    question_ids, letters = _question_layout(exam.id)
+    position = {q_id: i for i, q_id in enumerate(question_ids)}
+    width = len(question_ids) if width is None else width
+
+    stmt = (db.select(Submission.id, User.username, Class.name,
+                      Submission.score, Submission.start_time,
+                      Submission.end_time, elapsed_seconds(),
+                      SubmissionAnswer.question_id,
+                      SubmissionAnswer.selected_id,
+                      SubmissionAnswer.is_correct)
+            .join(User, User.id == Submission.user_id)
+            .outerjoin(Class, Class.id == User.class_id)
+            .outerjoin(SubmissionAnswer,
+                       SubmissionAnswer.submission_id == Submission.id)
+            .where(Submission.exam_id == exam.id,
+                   Submission.score.is_not(None))
+            .order_by(Submission.id)
+            .execution_options(yield_per=FETCH_ROWS))
+
+    result = db.session.execute(stmt)
+    for _, rows in groupby(result, key=lambda r: r[0]):
+        rows = list(rows)                 # các đáp án của một bài
+        _, username, class_name, score, started, ended, elapsed = rows[0][:7]
+        cells = [""] * (2 * width)
+        for *_, q_id, selected_id, is_correct in rows:
+            i = position.get(q_id)
+            if i is None:
+                continue                  # câu đã bị xoá khỏi đề
+            cells[2 * i] = letters.get(selected_id, "")
+            cells[2 * i + 1] = int(bool(is_correct))
+        yield [*prefix, username, class_name or "", score,
+               _fmt(started), _fmt(ended), elapsed, *cells]
+
+
+def question_header(width):
+    header = []
+    for n in range(1, width + 1):
+        header += [f"Q{n}", f"Q{n}_ok"]
+    return header
+
+
+def exam_table(exam):
+    """(header, rows) cho export một đề."""
+    width = db.session.query(db.func.count(Question.id))\
+                      .filter_by(exam_id=exam.id).scalar()
+    return BASE_HEADER + question_header(width), exam_rows(exam, width)
+
+
+def class_table(classroom):
+    """(header, rows) cho export mọi đề của một lớp, thêm cột exam."""
+    exams = Exam.query.filter_by(class_id=classroom.id).order_by(Exam.id).all()
+    width = (db.session.query(db.func.count(Question.id))
+             .join(Exam, Exam.id == Question.exam_id)
+             .filter(Exam.class_id == classroom.id)
+             .group_by(Question.exam_id)
+             .order_by(db.func.count(Question.id).desc())
+             .limit(1).scalar()) or 0
+
+    def rows():
+        for exam in exams:
+            yield from exam_rows(exam, width, prefix=(exam.title,))
+
+    return ["exam"] + BASE_HEADER + question_header(width), rows()
+
+
+def iter_csv(header, rows):
+    """Generator các chunk CSV (utf-8 BOM để Excel đọc đúng tiếng Việt)."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    buf.write("\ufeff")
+    writer.writerow(header)
+    for n, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if n % CHUNK_ROWS == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def write_xlsx(header, rows, fileobj):
+    """Ghi XLSX bằng openpyxl write-only (không giữ cả sheet trong RAM)."""
+    from openpyxl import Workbook       # tuỳ chọn: pip install openpyxl
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("results")
+    ws.append(header)
+    for row in rows:
+        ws.append(row)
+    wb.save(fileobj)
@@ -0,0 +1,150 @@
+"""Tạo bản ảnh nhỏ (WebP) cho ảnh upload, chạy trên thread pool nền.
+
+Mỗi ảnh ``uploads/<stem>.<ext>`` có thêm các biến thể
+``uploads/<stem>.<variant>.webp`` vừa với kích thước template hiển thị.
+Template dùng filter ``variant``: biến thể chưa có (đang xử lý, Pillow chưa
+cài, ảnh động...) thì vẫn trả về ảnh gốc.
+"""
+import os
+import threading
+
+from flask import current_app
+
+# tên -> khung tối đa (rộng, cao) px
+VARIANTS = {
+    "w400":  (400, 4000),      # ảnh câu hỏi – take_exam max-width:400px
+    "w300":  (300, 3000),      # ảnh đáp án  – take_exam max-width:300px
+    "thumb": (320, 80),        # submission_detail / form sửa – max-height:80px
+}
+WEBP_QUALITY = 80
+
+_executor = None
+_executor_lock = threading.Lock()
+_known = set()                 # biến thể đã thấy tồn tại trên đĩa
+_pending = set()               # ảnh đang chờ / đang xử lý
+
+
+def variant_path(rel_path, name):
+    stem = rel_path.rsplit(".", 1)[0]
+    return f"{stem}.{name}.webp"
+
+
+def variant(rel_path, name):
+    """Filter Jinja: đường dẫn biến thể nếu đã có, ngược lại ảnh gốc."""
+    if not rel_path:
+        return rel_path
+    path = variant_path(rel_path, name)
+    if path in _known:
+        return path
+    if os.path.exists(os.path.join(current_app.static_folder, path)):
+        _known.add(path)
+        return path
+    return rel_path
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _executor = ThreadPoolExecutor(
+                max_workers=current_app.config.get("IMAGE_WORKERS", 2),
+                thread_name_prefix="image-variants")
+        return _executor
+
+
+def process_async(rel_path):
+    """Đưa ảnh vừa lưu vào hàng xử lý nền; request không phải chờ."""
+    if not rel_path:
+        return None
+    with _executor_lock:
+        if rel_path in _pending:       # cùng nội dung vừa được upload lại
+            return None
+        _pending.add(rel_path)
+    app = current_app._get_current_object()
+    return _get_executor().submit(_make_variants, app, rel_path)
+
+
+def _make_variants(app, rel_path):
+    try:
+        made = _write_variants(app.static_folder, rel_path, app.logger)
+        if made:
+            with app.app_context():
+                _bump_exams_using(rel_path)
+        return made
+    finally:
+        with _executor_lock:
+            _pending.discard(rel_path)
+
+
+def _bump_exams_using(rel_path):
+    """Tăng content_version của các đề dùng ảnh này -> HTML đề render lại ở mọi worker.
+
+    Ảnh của câu hỏi chưa commit thì không khớp dòng nào – không sao: câu hỏi
+    commit sau đó tự tăng version, lúc render biến thể đã có trên đĩa.
+    """
+    from .cache import bump_exam_version
+    from .extensions import db
+    from .models import Question, Option
+
+    exam_ids = db.session.scalars(
+        db.select(Question.exam_id).where(Question.image_path == rel_path)
+        .union(db.select(Question.exam_id)
+               .join(Option, Option.question_id == Question.id)
+               .where(Option.image_path == rel_path))).all()
+    try:
+        for exam_id in exam_ids:
+            bump_exam_version(exam_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception("không cập nhật được version đề cho %s", rel_path)
+    finally:
+        db.session.remove()
+
+
+def _write_variants(static, rel_path, logger):
+    try:
+        from PIL import Image          # tuỳ chọn: pip install Pillow
+    except ImportError:
+        logger.warning("Pillow chưa cài – bỏ qua tạo biến thể ảnh")
+        return []
+
+    made = []
+    try:
+        with Image.open(os.path.join(static, rel_path)) as img:
+            if getattr(img, "is_animated", False):
+                return []              # giữ nguyên GIF/WebP động
+            img.load()
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA" if "A" in img.getbands()
+                                  or img.mode == "P" else "RGB")
+            for name, box in VARIANTS.items():
+                out = img.copy()
+                out.thumbnail(box, Image.LANCZOS)   # chỉ thu nhỏ, không phóng to
+                dest = os.path.join(static, variant_path(rel_path, name))
+                tmp = f"{dest}.{threading.get_ident()}.tmp"
+                out.save(tmp, "WEBP", quality=WEBP_QUALITY, method=4)
+                os.replace(tmp, dest)              # không lộ file ghi dở
+                made.append(name)
+    except (OSError, ValueError) as exc:
+        logger.warning("không tạo được biến thể cho %s: %s", rel_path, exc)
+    return made
+
+
+def forget(path):
+    """Bỏ `path` khỏi danh sách biến thể đã biết (file vừa bị xoá)."""
+    _known.discard(path)
+
+
+def delete_variants(rel_path):
+    """Xoá mọi biến thể của một ảnh (gọi cùng lúc xoá file gốc)."""
+    if not rel_path:
+        return
+    for name in VARIANTS:
+        path = variant_path(rel_path, name)
+        _known.discard(path)
+        try:
+            os.remove(os.path.join(current_app.static_folder, path))
+        except OSError:
+            pass
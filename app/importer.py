@@ -0,0 +1,321 @@
+"""Nhập hàng loạt câu hỏi từ JSON / CSV / Markdown (+ zip ảnh tuỳ chọn).
+
+Toàn bộ file được parse và kiểm tra trước; chỉ khi không có lỗi nào mới ghi
+ảnh và insert Question/Option bằng executemany trong một transaction.
+
+JSON – list (hoặc {"questions": [...]}) các object::
+
+    {"text": "...", "image": "h1.png",
+     "options": ["A", {"text": "B", "image": "b.png"}, "C"],
+     "correct": 2}                      # 1-based, hoặc "correct": true trong option
+
+CSV – header ``question,image,correct,option_1,option_2,...`` (bao nhiêu option
+cũng được; cột ``option_<n>_image`` tuỳ chọn). ``correct`` là số hoặc chữ cái.
+
+Markdown – mỗi câu là phần text (markdown tuỳ ý) kết thúc bằng một khối
+```` ```options ````; dòng ``- [x]`` là đáp án đúng, ``- [ ]`` là đáp án sai.
+Ảnh: dòng ``@image ten.png`` trong text câu hỏi, hoặc `` @image ten.png`` ở cuối
+dòng đáp án::
+
+    Tính $1 + 1$?
+    @image cong.png
+
+    ```options
+    - [ ] 1
+    - [x] 2
+    - [ ] 3 @image ba.png
+    ```
+"""
+import csv
+import io
+import json
+import re
+import zipfile
+
+from sqlalchemy import insert
+
+from .extensions import db
+from .models import Question, Option
+from . import uploads
+from .cache import bump_exam_version
+from .utils import md_safe
+
+OPTION_MAX_LEN = 255           # Option.text = String(255)
+IMAGE_MAX_BYTES = 4 * 1024 * 1024      # mỗi ảnh trong zip (giải nén), như MAX_CONTENT_LENGTH
+ZIP_MAX_BYTES = 64 * 1024 * 1024       # tổng dung lượng giải nén của cả zip
+ZIP_MAX_FILES = 2000
+
+
+class ImportFormatError(ValueError):
+    """File không đọc được ở mức toàn cục (sai định dạng, zip hỏng...)."""
+
+
+_IMAGE_RE = re.compile(r"\s*@image\s+(\S+)\s*$")
+_OPTION_RE = re.compile(r"^\s*[-*]\s*\[( |x|X)\]\s?(.*)$")
+
+
+# ---------- parse: mọi định dạng -> list dict thống nhất ----------
+def _split_image(line):
+    m = _IMAGE_RE.search(line)
+    if not m:
+        return line, None
+    return line[:m.start()], m.group(1)
+
+
+def _name(value):
+    return str(value) if value else None
+
+
+def parse_json(data):
+    try:
+        doc = json.loads(data.decode("utf-8-sig"))
+    except (UnicodeDecodeError, ValueError) as exc:
+        raise ImportFormatError(f"JSON không hợp lệ: {exc}")
+    if isinstance(doc, dict):
+        doc = doc.get("questions")
+    if not isinstance(doc, list):
+        raise ImportFormatError("JSON phải là list câu hỏi hoặc {\"questions\": [...]}")
+
+    items = []
+    for raw in doc:
+        if not isinstance(raw, dict):
+            items.append({"error": "mỗi câu hỏi phải là object"})
+            continue
+        options = []
+        for opt in raw.get("options") or []:
+            if isinstance(opt, dict):
+                options.append({"text": str(opt.get("text") or ""),
+                                "image": _name(opt.get("image")),
+                                "correct": bool(opt.get("correct"))})
+            else:
+                options.append({"text": str(opt), "image": None, "correct": False})
+        _apply_correct(options, raw.get("correct"))
+        items.append({"text": str(raw.get("text") or ""),
+                      "image": _name(raw.get("image")),
+                      "options": options})
+    return items
+
+
+def parse_csv(data):
+    try:
+        reader = csv.DictReader(io.StringIO(data.decode("utf-8-sig")))
+    except UnicodeDecodeError as exc:
+        raise ImportFormatError(f"CSV phải là UTF-8: {exc}")
+    fields = reader.fieldnames or []
+    option_cols = sorted((f for f in fields if re.fullmatch(r"option_\d+", f)),
+                         key=lambda f: int(f.split("_")[1]))
+    if "question" not in fields or not option_cols:
+        raise ImportFormatError("CSV cần cột question, correct, option_1, option_2...")
+
+    items = []
+    for row in reader:
+        options = []
+        for col in option_cols:
+            text = (row.get(col) or "").strip()
+            image = (row.get(f"{col}_image") or "").strip() or None
+            if text or image:
+                options.append({"text": text, "image": image, "correct": False})
+        _apply_correct(options, (row.get("correct") or "").strip())
+        items.append({"text": (row.get("question") or "").strip(),
+                      "image": (row.get("image") or "").strip() or None,
+                      "options": options})
+    return items
+
+
+def parse_markdown(data):
+    try:
+        lines = data.decode("utf-8-sig").splitlines()
+    except UnicodeDecodeError as exc:
+        raise ImportFormatError(f"Markdown phải là UTF-8: {exc}")
+
+    items, text, image, options = [], [], None, None
+    in_code = False
+    for line in lines:
+        stripped = line.strip()
+        if options is not None:                       # trong ```options
+            if stripped.startswith("```"):
+                items.append({"text": "\n".join(text).strip(),
+                              "image": image, "options": options})
+                text, image, options = [], None, None
+                continue
+            if not stripped:
+                continue
+            m = _OPTION_RE.match(line)
+            if not m:
+                options.append({"error": f"dòng đáp án không hợp lệ: {stripped!r}"})
+                continue
+            opt_text, opt_image = _split_image(m.group(2))
+            options.append({"text": opt_text.strip(), "image": opt_image,
+                            "correct": m.group(1) in "xX"})
+        elif not in_code and re.match(r"^```\s*options\s*$", stripped):
+            options = []
+        else:
+            if stripped.startswith("```"):
+                in_code = not in_code                 # code fence trong câu hỏi
+            img = None if in_code else _IMAGE_RE.fullmatch(line)
+            if img:
+                image = img.group(1)
+            else:
+                text.append(line)
+
+    if options is not None:
+        items.append({"error": "khối ```options chưa được đóng"})
+    elif "\n".join(text).strip():
+        items.append({"error": "có text sau câu hỏi cuối nhưng không có ```options"})
+    return items
+
+
+PARSERS = {"json": parse_json, "csv": parse_csv,
+           "md": parse_markdown, "markdown": parse_markdown}
+
+
+def _apply_correct(options, correct):
+    """`correct` dạng 1-based / chữ cái -> đánh dấu option tương ứng."""
+    if correct in (None, ""):
+        return
+    if isinstance(correct, str) and correct.isalpha() and len(correct) == 1:
+        idx = ord(correct.upper()) - ord("A")
+    else:
+        try:
+            idx = int(correct) - 1
+        except (TypeError, ValueError):
+            idx = -1
+    if 0 <= idx < len(options):
+        options[idx]["correct"] = True
+    else:
+        options.append({"error": f"correct = {correct!r} không khớp đáp án nào"})
+
+
+# ---------- kiểm tra ----------
+def validate(items, images, allowed_ext):
+    """-> list (số thứ tự câu, thông báo lỗi). Rỗng = hợp lệ."""
+    errors = []
+
+    def check_image(n, name):
+        if not name:
+            return
+        if name not in images:
+            errors.append((n, f"không thấy ảnh {name!r} trong file zip"))
+        elif name.rsplit(".", 1)[-1].lower() not in allowed_ext:
+            errors.append((n, f"ảnh {name!r}: định dạng không cho phép"))
+
+    if not items:
+        errors.append((0, "file không có câu hỏi nào"))
+    for n, item in enumerate(items, start=1):
+        if "error" in item:
+            errors.append((n, item["error"]))
+            continue
+        if not item["text"] and not item["image"]:
+            errors.append((n, "câu hỏi cần text hoặc ảnh"))
+        check_image(n, item["image"])
+
+        options = item["options"]
+        for opt in options:
+            if "error" in opt:
+                errors.append((n, opt["error"]))
+        options = [o for o in options if "error" not in o]
+        if len(options) < 2:
+            errors.append((n, "cần ít nhất 2 đáp án"))
+        for i, opt in enumerate(options, start=1):
+            if not opt["text"] and not opt["image"]:
+                errors.append((n, f"đáp án {i} thiếu cả text lẫn ảnh"))
+            if len(opt["text"]) > OPTION_MAX_LEN:
+                errors.append((n, f"đáp án {i} dài quá {OPTION_MAX_LEN} ký tự"))
+            check_image(n, opt["image"])
+        n_correct = sum(o["correct"] for o in options)
+        if n_correct != 1:
+            errors.append((n, f"cần đúng 1 đáp án đúng (đang có {n_correct})"))
+    return errors
+
+
+def read_images(zip_bytes):
+    """{tên file: bytes} của zip ảnh; từ chối zip bomb trước khi giải nén.
+
+    Kích thước khai trong header có thể sai nên mỗi entry chỉ được đọc tối đa
+    giới hạn + 1 byte.
+    """
+    if not zip_bytes:
+        return {}
+    try:
+        with zipfile.ZipFile(io.BytesIO(zip_bytes)) as zf:
+            entries = [info for info in zf.infolist() if not info.is_dir()]
+            if len(entries) > ZIP_MAX_FILES:
+                raise ImportFormatError(
+                    f"zip có {len(entries)} file, tối đa {ZIP_MAX_FILES}")
+            if sum(info.file_size for info in entries) > ZIP_MAX_BYTES:
+                raise ImportFormatError(
+                    f"zip giải nén vượt {ZIP_MAX_BYTES // 2**20} MB")
+            images, total = {}, 0
+            for info in entries:
+                if info.file_size > IMAGE_MAX_BYTES:
+                    raise ImportFormatError(_too_big(info.filename))
+                with zf.open(info) as fh:
+                    data = fh.read(IMAGE_MAX_BYTES + 1)
+                if len(data) > IMAGE_MAX_BYTES:
+                    raise ImportFormatError(_too_big(info.filename))
+                total += len(data)
+                if total > ZIP_MAX_BYTES:
+                    raise ImportFormatError(
+                        f"zip giải nén vượt {ZIP_MAX_BYTES // 2**20} MB")
+                images[info.filename.rsplit("/", 1)[-1]] = data
+            return images
+    except zipfile.BadZipFile as exc:
+        raise ImportFormatError(f"file ảnh không phải zip hợp lệ: {exc}")
+
+
+def _too_big(name):
+    return f"ảnh {name!r} lớn hơn {IMAGE_MAX_BYTES // 2**20} MB sau khi giải nén"
+
+
+# ---------- ghi ----------
+def import_questions(exam, fmt, data, zip_bytes=None, allowed_ext=()):
+    """Parse + kiểm tra + insert. -> (số câu đã thêm, list lỗi).
+
+    Có lỗi thì không ghi gì (kể cả ảnh).
+    """
+    parser = PARSERS.get(fmt)
+    if parser is None:
+        raise ImportFormatError(f"định dạng {fmt!r} không hỗ trợ (json/csv/md)")
+    items = parser(data)
+    images = read_images(zip_bytes)
+    errors = validate(items, images, allowed_ext)
+    if errors:
+        return 0, errors
+
+    saved, created = {}, {}
+
+    def image_path(name):
+        if name and name not in saved:
+            saved[name] = uploads.store(images[name], name.rsplit(".", 1)[-1].lower(),
+                                        created=created)
+        return saved.get(name)
+
+    try:                                    # ảnh được ghi dần: lỗi ở đâu cũng dọn
+        # order_idx: 1 query MAX, phần còn lại đánh số trong bộ nhớ
+        base = db.session.query(db.func.max(Question.order_idx))\
+                         .filter_by(exam_id=exam.id).scalar() or 0
+        q_rows = [{"exam_id": exam.id,
+                   "text": item["text"],
+                   "text_html": md_safe(item["text"]),
+                   "image_path": image_path(item["image"]),
+                   "order_idx": base + n}
+                  for n, item in enumerate(items, start=1)]
+        q_ids = db.session.scalars(
+            insert(Question).returning(Question.id,
+                                       sort_by_parameter_order=True),
+            q_rows).all()
+        o_rows = [{"question_id": q_id,
+                   "text": opt["text"],
+                   "text_html": md_safe(opt["text"]),
+                   "image_path": image_path(opt["image"]),
+                   "is_correct": opt["correct"]}
+                  for q_id, item in zip(q_ids, items)
+                  for opt in item["options"]]
+        db.session.execute(insert(Option), o_rows)
+        bump_exam_version(exam.id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        uploads.discard(created)            # chỉ file do lần nhập này tạo ra
+        raise
+    return len(q_ids), []
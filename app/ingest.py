@@ -0,0 +1,335 @@
+"""Hàng đợi nộp bài bất đồng bộ (bật bằng SUBMIT_QUEUE_ENABLED).
+
+submit_exam chỉ ghi đáp án thô vào một journal SQLite (WAL, synchronous=FULL)
+rồi trả về ngay; pool worker nền chấm bài và commit theo lô vào DB chính.
+
+Journal là nguồn sự thật cho tới khi DB chính commit xong: entry chỉ bị xoá
+sau commit, nên crash giữa chừng thì entry được chấm lại. Việc chấm lại là
+idempotent vì điểm chỉ được ghi khi Submission.score còn NULL.
+
+Lô lỗi thì từng entry được chấm lại trong transaction riêng, để một entry hỏng
+không chặn cả lô. Entry lỗi nằm yên tới lần claim lại sau
+``SUBMIT_QUEUE_STALE_SECONDS``; lỗi tới lần thứ ``SUBMIT_QUEUE_MAX_ATTEMPTS``
+thì bị đánh dấu chết (``failed_at``, ``error``) và không được claim nữa – vẫn
+nằm trong journal để admin xem (``/admin/queue``) và xử lý tay
+(``flask queue retry`` / ``flask queue drop``). Entry chết không còn tính là
+"đang chờ": lượt thi của nó được sweeper / start_exam chốt từ đáp án đã
+autosave như một lượt bỏ dở.
+"""
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import update
+
+from .extensions import db
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS submit_queue (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    submission_id INTEGER NOT NULL,
+    user_id       INTEGER NOT NULL,
+    exam_id       INTEGER NOT NULL,
+    answers       TEXT    NOT NULL,      -- JSON {"question_<id>": "<option_id>"}
+    end_time      TEXT    NOT NULL,      -- ISO, thời điểm bấm nộp
+    claimed_at    REAL,                  -- NULL = đang chờ
+    created_at    REAL    NOT NULL,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    failed_at     REAL,                  -- khác NULL = entry chết, không chấm nữa
+    error         TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_submit_queue_claimed ON submit_queue (claimed_at, id);
+CREATE INDEX IF NOT EXISTS ix_submit_queue_sub ON submit_queue (submission_id);
+"""
+
+_path = None
+_wakeup = threading.Event()
+_workers = []
+
+
+_schema_ready = False
+
+
+def _connect():
+    global _schema_ready
+    conn = sqlite3.connect(_path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=FULL")
+    if not _schema_ready:                       # journal tạo ở lần dùng đầu tiên
+        conn.executescript(_SCHEMA)
+        columns = {r[1] for r in conn.execute("PRAGMA table_info(submit_queue)")}
+        for column, ddl in (("attempts", "INTEGER NOT NULL DEFAULT 0"),
+                            ("failed_at", "REAL"), ("error", "TEXT")):
+            if column not in columns:           # journal tạo bởi bản cũ
+                conn.execute(f"ALTER TABLE submit_queue ADD COLUMN {column} {ddl}")
+        _schema_ready = True
+    return conn
+
+
+def _start_workers(app):
+    if _workers:
+        return
+    for i in range(app.config.get("SUBMIT_QUEUE_WORKERS", 2)):
+        t = threading.Thread(target=_worker_loop, args=(app,),
+                             name=f"submit-queue-{i}", daemon=True)
+        t.start()
+        _workers.append(t)
+
+
+def init_app(app):
+    """Bật hàng đợi; pool worker khởi động ở request đầu tiên (app/background.py)."""
+    global _path
+    from . import background
+    if not app.config.get("SUBMIT_QUEUE_ENABLED"):
+        return
+    _path = app.config["SUBMIT_QUEUE_PATH"]
+    background.register(app, _start_workers)
+
+
+def enabled():
+    return _path is not None
+
+
+# ---------- phía request ----------
+def enqueue(sub, form, end_time):
+    answers = {k: v for k, v in form.items() if k.startswith("question_")}
+    conn = _connect()
+    try:
+        conn.execute(
+            "INSERT INTO submit_queue"
+            " (submission_id, user_id, exam_id, answers, end_time, created_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (sub.id, sub.user_id, sub.exam_id, json.dumps(answers),
+             end_time.isoformat(), time.time()))
+    finally:
+        conn.close()
+    _wakeup.set()
+
+
+def is_queued(submission_id):
+    if not enabled():
+        return False
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT 1 FROM submit_queue"
+                           " WHERE submission_id = ? AND failed_at IS NULL",
+                           (submission_id,)).fetchone()
+    finally:
+        conn.close()
+    return row is not None
+
+
+def queued_ids(submission_ids):
+    """Tập các id trong `submission_ids` đang nằm trong hàng đợi (trừ entry chết)."""
+    if not enabled() or not submission_ids:
+        return set()
+    conn = _connect()
+    try:
+        marks = ",".join("?" * len(submission_ids))
+        rows = conn.execute("SELECT submission_id FROM submit_queue"
+                            f" WHERE submission_id IN ({marks}) AND failed_at IS NULL",
+                            list(submission_ids)).fetchall()
+    finally:
+        conn.close()
+    return {r[0] for r in rows}
+
+
+def queue_depth():
+    """(đang chờ, đang xử lý, đã chết) – dùng cho metric."""
+    if not enabled():
+        return 0, 0, 0
+    conn = _connect()
+    try:
+        waiting, claimed, dead = conn.execute(
+            "SELECT COUNT(*) - COUNT(claimed_at), COUNT(claimed_at) - COUNT(failed_at),"
+            " COUNT(failed_at) FROM submit_queue").fetchone()
+    finally:
+        conn.close()
+    return waiting, claimed, dead
+
+
+# ---------- entry chết ----------
+def dead_entries(limit=100):
+    """Các entry chết mới nhất (dict) – cho /admin/queue."""
+    if not enabled():
+        return []
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            "SELECT id, submission_id, user_id, exam_id, attempts, failed_at, error"
+            " FROM submit_queue WHERE failed_at IS NOT NULL"
+            " ORDER BY failed_at DESC LIMIT ?", (limit,)).fetchall()
+    finally:
+        conn.close()
+    keys = ("id", "submission_id", "user_id", "exam_id", "attempts", "failed_at", "error")
+    return [dict(zip(keys, r)) for r in rows]
+
+
+def _dead_where(entry_ids):
+    if not entry_ids:
+        return "failed_at IS NOT NULL", []
+    marks = ",".join("?" * len(entry_ids))
+    return f"failed_at IS NOT NULL AND id IN ({marks})", list(entry_ids)
+
+
+def retry_dead(entry_ids=()):
+    """Đưa entry chết (mọi entry nếu không chỉ định) về hàng đợi. -> số entry."""
+    where, params = _dead_where(entry_ids)
+    conn = _connect()
+    try:
+        cur = conn.execute("UPDATE submit_queue SET failed_at = NULL, error = NULL,"
+                           f" claimed_at = NULL, attempts = 0 WHERE {where}", params)
+    finally:
+        conn.close()
+    _wakeup.set()
+    return cur.rowcount
+
+
+def drop_dead(entry_ids=()):
+    """Xoá entry chết (mọi entry nếu không chỉ định). -> số entry."""
+    where, params = _dead_where(entry_ids)
+    conn = _connect()
+    try:
+        cur = conn.execute(f"DELETE FROM submit_queue WHERE {where}", params)
+    finally:
+        conn.close()
+    return cur.rowcount
+
+
+# ---------- phía worker ----------
+def _claim(batch_size, stale_after):
+    """Giành một lô entry; entry bị giữ quá `stale_after` giây được lấy lại."""
+    now = time.time()
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(
+            "SELECT id, submission_id, user_id, exam_id, answers, end_time"
+            " FROM submit_queue"
+            " WHERE failed_at IS NULL AND (claimed_at IS NULL OR claimed_at < ?)"
+            " ORDER BY id LIMIT ?",
+            (now - stale_after, batch_size)).fetchall()
+        if rows:
+            conn.executemany("UPDATE submit_queue SET claimed_at = ?,"
+                             " attempts = attempts + 1 WHERE id = ?",
+                             [(now, r[0]) for r in rows])
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+    return rows
+
+
+def _ack(entry_ids):
+    conn = _connect()
+    try:
+        conn.executemany("DELETE FROM submit_queue WHERE id = ?",
+                         [(i,) for i in entry_ids])
+    finally:
+        conn.close()
+
+
+def _fail(failed, max_attempts):
+    """Ghi lỗi; entry đã thử đủ `max_attempts` lần thì đánh dấu chết."""
+    conn = _connect()
+    try:
+        conn.executemany(
+            "UPDATE submit_queue SET error = ?,"
+            " failed_at = CASE WHEN attempts >= ? THEN ? END WHERE id = ?",
+            [(error, max_attempts, time.time(), entry_id)
+             for entry_id, error in failed])
+    finally:
+        conn.close()
+
+
+def process_batch(rows):
+    """Chấm cả lô trong một transaction; lỗi thì chấm lại từng entry.
+
+    -> (số bài đã ghi, [(entry id, lỗi)] các entry không chấm được).
+    """
+    try:
+        return _grade(rows), []
+    except Exception as exc:
+        db.session.rollback()
+        if len(rows) == 1:
+            return 0, [_failure(rows[0], exc)]
+    written, failed = 0, []
+    for row in rows:
+        try:
+            written += _grade([row])
+        except Exception as exc:
+            db.session.rollback()
+            failed.append(_failure(row, exc))
+    return written, failed
+
+
+def _failure(row, exc):
+    current_app.logger.error("submit queue: entry %d (submission %d) failed",
+                             row[0], row[1], exc_info=exc)
+    return row[0], f"{type(exc).__name__}: {exc}"
+
+
+def _grade(rows):
+    """Chấm và commit `rows` trong một transaction. Trả về số bài đã ghi."""
+    from .autosave import final_answers, write_answers
+    from .cache import get_answer_key
+    from .models import Submission
+    from . import stats
+
+    all_answers, all_replaced = [], []
+    written = 0
+    for _, sub_id, user_id, exam_id, answers, end_time in rows:
+        # claim trước (chưa được chấm ở lần trước?), rồi mới đọc đáp án đã autosave
+        end_dt = datetime.fromisoformat(end_time)
+        res = db.session.execute(
+            update(Submission)
+            .where(Submission.id == sub_id, Submission.score.is_(None))
+            .values(end_time=end_dt))
+        if not res.rowcount:
+            continue
+        key = get_answer_key(exam_id)
+        correct, changed, replaced = final_answers(sub_id, key, json.loads(answers))
+        total = len(key.question_ids)
+        score = int(100 * correct / total) if total else 0
+        db.session.execute(
+            update(Submission).where(Submission.id == sub_id).values(score=score))
+        stats.finished(user_id, exam_id, sub_id, score, end_dt)
+        all_answers.extend(changed)
+        all_replaced.extend(replaced)
+        written += 1
+
+    write_answers(all_answers, all_replaced)
+    db.session.commit()
+    return written
+
+
+def _worker_loop(app):
+    batch_size = app.config.get("SUBMIT_QUEUE_BATCH", 50)
+    stale_after = app.config.get("SUBMIT_QUEUE_STALE_SECONDS", 60)
+    max_attempts = app.config.get("SUBMIT_QUEUE_MAX_ATTEMPTS", 5)
+    while True:
+        try:
+            rows = _claim(batch_size, stale_after)
+            if not rows:
+                _wakeup.wait(timeout=1.0)
+                _wakeup.clear()
+                continue
+            with app.app_context():
+                try:
+                    written, failed = process_batch(rows)
+                except Exception:
+                    db.session.rollback()
+                    raise
+                finally:
+                    db.session.remove()
+            failed_ids = {entry_id for entry_id, _ in failed}
+            _ack([r[0] for r in rows if r[0] not in failed_ids])
+            if failed:
+                _fail(failed, max_attempts)
+            app.logger.info("submit queue: graded %d/%d submissions",
+                            written, len(rows))
+        except Exception:
+            app.logger.exception("submit queue worker error")
+            time.sleep(1.0)
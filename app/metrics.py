@@ -0,0 +1,254 @@
+"""Đo hiệu năng từng request + endpoint metric dạng Prometheus.
+
+Mỗi request đếm:
+
+* số câu SQL và tổng thời gian (event ``before/after_cursor_execute`` của engine),
+* thời gian render template (signal ``before_render_template`` /
+  ``template_rendered``; template lồng nhau chỉ tính lớp ngoài cùng),
+* tổng thời gian xử lý.
+
+Request chậm hơn ``METRICS_SLOW_MS`` hoặc chạy nhiều hơn ``METRICS_QUERY_WARN``
+câu SQL được ghi log kèm danh sách câu lệnh đã gộp theo nội dung (N+1 hiện
+ra thành một câu lặp lại hàng chục lần).
+
+Số liệu gộp theo endpoint (histogram độ trễ, histogram số query / request),
+hit rate các cache và độ sâu hàng đợi chấm bài có tại ``GET /admin/metrics``
+(text format của Prometheus). Số liệu nằm trong bộ nhớ từng process: chạy nhiều
+worker thì mỗi worker trả phần của mình, mọi series mang nhãn ``worker="<pid>"``
+để các lần scrape rơi vào worker khác nhau không bị trộn lẫn (gộp bằng
+``sum without (worker)`` phía Prometheus).
+"""
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from flask import (before_render_template, current_app, g, has_request_context,
+                   request, template_rendered)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+MAX_STATEMENTS = 500             # số câu lệnh giữ lại mỗi request để in log
+UNMATCHED = "<unmatched>"        # 404, method không hợp lệ...
+
+_lock = threading.Lock()
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.count += 1
+
+
+_latency = {}                          # endpoint -> _Histogram (giây)
+_queries = {}                          # endpoint -> _Histogram (số câu SQL)
+_sql_seconds = defaultdict(float)      # endpoint -> tổng giây chạy SQL
+_template_seconds = defaultdict(float)
+_requests = Counter()                  # (endpoint, status) -> số request
+
+
+# ---------- SQL ----------
+def _perf():
+    """Bộ đếm của request hiện tại (None ngoài request: thread nền, CLI...)."""
+    return g.get("_perf") if has_request_context() else None
+
+
+def _before_cursor(conn, cursor, statement, parameters, context, executemany):
+    if _perf() is not None:
+        conn.info.setdefault("_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor(conn, cursor, statement, parameters, context, executemany):
+    perf = _perf()
+    starts = conn.info.get("_query_start")
+    if perf is None or not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    perf["queries"] += 1
+    perf["sql"] += elapsed
+    if len(perf["statements"]) < MAX_STATEMENTS:
+        perf["statements"].append((statement, elapsed))
+
+
+# ---------- template ----------
+def _before_render(sender, template, context, **extra):
+    perf = _perf()
+    if perf is not None:
+        perf["tpl_stack"].append(time.perf_counter())
+
+
+def _rendered(sender, template, context, **extra):
+    perf = _perf()
+    if perf is None or not perf["tpl_stack"]:
+        return
+    started = perf["tpl_stack"].pop()
+    if not perf["tpl_stack"]:          # lớp ngoài cùng đã gồm template con
+        perf["template"] += time.perf_counter() - started
+
+
+# ---------- request ----------
+def _start_request():
+    g._perf = {"start": time.perf_counter(), "queries": 0, "sql": 0.0,
+               "template": 0.0, "tpl_stack": [], "statements": [],
+               "status": 500}
+
+
+def _record_status(response):
+    perf = _perf()
+    if perf is not None:
+        perf["status"] = response.status_code
+    return response
+
+
+def _finish_request(exc=None):
+    perf = g.pop("_perf", None)
+    if perf is None:
+        return
+    elapsed = time.perf_counter() - perf["start"]
+    endpoint = request.endpoint or UNMATCHED
+    with _lock:
+        _latency.setdefault(endpoint, _Histogram(LATENCY_BUCKETS)).observe(elapsed)
+        _queries.setdefault(endpoint, _Histogram(QUERY_BUCKETS)).observe(perf["queries"])
+        _sql_seconds[endpoint] += perf["sql"]
+        _template_seconds[endpoint] += perf["template"]
+        _requests[(endpoint, perf["status"])] += 1
+
+    config = current_app.config
+    slow = elapsed * 1000 >= config.get("METRICS_SLOW_MS", 500)
+    if slow or perf["queries"] >= config.get("METRICS_QUERY_WARN", 50):
+        current_app.logger.warning(
+            "%s %s %s -> %s: %.0f ms, %d queries (%.0f ms SQL), "
+            "templates %.0f ms\n%s",
+            "slow request" if slow else "query-heavy request",
+            request.method, request.path, perf["status"], elapsed * 1000,
+            perf["queries"], perf["sql"] * 1000, perf["template"] * 1000,
+            format_statements(perf["statements"]))
+
+
+_WS = re.compile(r"\s+")
+
+
+def format_statements(statements, limit=15, width=240):
+    """Gộp câu lệnh giống nhau: '  12x   3.4 ms  SELECT ...' (tốn thời gian nhất trước)."""
+    grouped = defaultdict(lambda: [0, 0.0])
+    for statement, elapsed in statements:
+        entry = grouped[_WS.sub(" ", statement).strip()]
+        entry[0] += 1
+        entry[1] += elapsed
+    top = sorted(grouped.items(), key=lambda kv: kv[1][1], reverse=True)[:limit]
+    return "\n".join(f"  {n:>4}x {sec * 1000:8.1f} ms  {sql[:width]}"
+                     for sql, (n, sec) in top)
+
+
+# ---------- Prometheus ----------
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _worker():
+    """Nhãn chung của mọi series: pid của worker (gunicorn fork sau import)."""
+    return f'worker="{os.getpid()}"'
+
+
+def _histogram_lines(name, help_text, series):
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    worker = _worker()
+    for endpoint, hist in sorted(series.items()):
+        labels = f'{worker},endpoint="{_label(endpoint)}"'
+        cumulative = 0
+        for bound, count in zip(hist.buckets, hist.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {hist.count}')
+        lines.append(f"{name}_sum{{{labels}}} {hist.total}")
+        lines.append(f"{name}_count{{{labels}}} {hist.count}")
+    return lines
+
+
+def _counter_lines(name, help_text, series, kind="counter"):
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    worker = _worker()
+    for labels, value in sorted(series.items()):
+        rendered = ",".join([worker] + [f'{k}="{_label(v)}"' for k, v in labels])
+        lines.append(f"{name}{{{rendered}}} {value}")
+    return lines
+
+
+def render_prometheus():
+    """Toàn bộ metric của process này, text format 0.0.4."""
+    from . import ingest
+    from .cache import cache_stats
+
+    with _lock:
+        lines = _histogram_lines("quiz_request_duration_seconds",
+                                 "Thời gian xử lý request theo endpoint.", _latency)
+        lines += _histogram_lines("quiz_request_queries",
+                                  "Số câu SQL mỗi request theo endpoint.", _queries)
+        lines += _counter_lines(
+            "quiz_request_sql_seconds_total", "Tổng thời gian chạy SQL.",
+            {(("endpoint", ep),): v for ep, v in _sql_seconds.items()})
+        lines += _counter_lines(
+            "quiz_request_template_seconds_total", "Tổng thời gian render template.",
+            {(("endpoint", ep),): v for ep, v in _template_seconds.items()})
+        lines += _counter_lines(
+            "quiz_requests_total", "Số request theo endpoint và status.",
+            {(("endpoint", ep), ("status", st)): n for (ep, st), n in _requests.items()})
+
+    caches = cache_stats()
+    for metric, field, kind, help_text in (
+            ("quiz_cache_hits_total", "hits", "counter", "Cache hit."),
+            ("quiz_cache_misses_total", "misses", "counter", "Cache miss."),
+            ("quiz_cache_size", "size", "gauge", "Số entry trong cache."),
+            ("quiz_cache_hit_ratio", "hit_rate", "gauge", "hits / (hits + misses).")):
+        lines += _counter_lines(
+            metric, help_text,
+            {(("cache", name),): s[field] for name, s in caches.items()
+             if s[field] is not None}, kind=kind)
+
+    waiting, claimed, dead = ingest.queue_depth()
+    for metric, value, help_text in (
+            ("quiz_startup_seconds", current_app.extensions.get("startup_seconds", 0),
+             "Thời gian create_app của process này."),
+            ("quiz_submit_queue_depth", waiting, "Bài nộp đang chờ chấm."),
+            ("quiz_submit_queue_in_progress", claimed, "Bài nộp worker đang chấm."),
+            ("quiz_submit_queue_failed", dead,
+             "Bài nộp lỗi quá số lần thử, cần xử lý tay.")):
+        lines += _counter_lines(metric, help_text, {(): value}, kind="gauge")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """Xoá số liệu đã gộp (benchmark / đo lại từ đầu)."""
+    with _lock:
+        for store in (_latency, _queries, _sql_seconds, _template_seconds, _requests):
+            store.clear()
+
+
+# ---------- khởi tạo ----------
+def init_app(app):
+    if not app.config.get("METRICS_ENABLED", True):
+        return
+    for name, fn in (("before_cursor_execute", _before_cursor),
+                     ("after_cursor_execute", _after_cursor)):
+        if not event.contains(Engine, name, fn):      # create_app gọi nhiều lần
+            event.listen(Engine, name, fn)
+    before_render_template.connect(_before_render)   # blinker: kết nối lại là no-op
+    template_rendered.connect(_rendered)
+    app.before_request(_start_request)
+    app.after_request(_record_status)
+    app.teardown_request(_finish_request)
@@ -0,0 +1,150 @@
+"""Migration nhỏ cho DB đã tồn tại.
+
+`db.create_all()` chỉ tạo bảng còn thiếu, không thêm cột / index vào bảng cũ.
+Mỗi bước dưới đây idempotent; số bước đã chạy lưu trong bảng `schema_version`.
+Thêm thay đổi schema mới = thêm một hàm vào cuối MIGRATIONS.
+"""
+from .extensions import db
+
+
+def _add_column(table, column, ddl):
+    insp = db.inspect(db.engine)
+    if column not in {c["name"] for c in insp.get_columns(table)}:
+        db.session.execute(
+            db.text(f'ALTER TABLE "{table}" ADD COLUMN {column} {ddl}'))
+
+
+def _create_indexes(*models):
+    conn = db.session.connection()
+    for model in models:
+        for index in model.__table__.indexes:
+            index.create(conn, checkfirst=True)
+
+
+# ---------- các bước ----------
+def m001_text_html():
+    """Cột HTML render sẵn cho Question/Option."""
+    _add_column("question", "text_html", "TEXT")
+    _add_column("option",   "text_html", "TEXT")
+
+
+def m002_hot_query_indexes():
+    """Index cho submission / answer / question / option."""
+    from .models import Question, Option, Submission, SubmissionAnswer
+    _create_indexes(Question, Option, Submission, SubmissionAnswer)
+
+
+def m003_submission_end_index():
+    """Index (exam_id, end_time) cho danh sách bài nộp."""
+    from .models import Submission
+    _create_indexes(Submission)
+
+
+def m004_submission_saved_at():
+    """Thời điểm autosave gần nhất của lượt đang làm."""
+    _add_column("submission", "saved_at", "DATETIME")
+
+
+def m005_user_exam_stats():
+    """Bảng tổng hợp (user, đề) – tạo nếu thiếu và dựng từ Submission."""
+    from .models import UserExamStats
+    from . import stats
+    UserExamStats.__table__.create(db.session.connection(), checkfirst=True)
+    stats.rebuild()
+
+
+def m006_exam_content_version():
+    """Version nội dung đề lưu trong DB, dùng chung cho mọi worker."""
+    _add_column("exam", "content_version", "INTEGER NOT NULL DEFAULT 0")
+
+
+MIGRATIONS = [
+    m001_text_html,
+    m002_hot_query_indexes,
+    m003_submission_end_index,
+    m004_submission_saved_at,
+    m005_user_exam_stats,
+    m006_exam_content_version,
+]
+
+
+def current_version():
+    db.session.execute(db.text(
+        "CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+    version = db.session.execute(
+        db.text("SELECT MAX(version) FROM schema_version")).scalar()
+    return version or 0
+
+
+def upgrade():
+    """Chạy các bước chưa áp dụng. Trả về danh sách tên bước vừa chạy."""
+    applied = []
+    version = current_version()
+    for number, step in enumerate(MIGRATIONS, start=1):
+        if number <= version:
+            continue
+        step()
+        db.session.execute(db.text("DELETE FROM schema_version"))
+        db.session.execute(db.text("INSERT INTO schema_version (version) "
+                                   "VALUES (:v)"), {"v": number})
+        db.session.commit()
+        applied.append(step.__name__)
+    db.session.commit()
+    return applied
+
+
+# ---------- kiểm tra query nóng có dùng index ----------
+def hot_queries():
+    """(tên, statement) của các query chạy trên mỗi lượt thi / chấm / xem."""
+    from sqlalchemy import select, func
+    from .models import (Question, Option, Submission, SubmissionAnswer,
+                         UserExamStats)
+
+    return [
+        ("start_exam: pending submission",
+         select(Submission.id)
+         .where(Submission.user_id == 1, Submission.exam_id == 1,
+                Submission.score.is_(None))
+         .order_by(Submission.id.desc()).limit(1)),
+        ("attempts_used",
+         select(UserExamStats.attempts_used)
+         .where(UserExamStats.user_id == 1, UserExamStats.exam_id == 1)),
+        ("view_submissions",
+         select(Submission.id)
+         .where(Submission.exam_id == 1, Submission.score.is_not(None))),
+        ("view_submission: answers",
+         select(SubmissionAnswer.id)
+         .where(SubmissionAnswer.submission_id == 1)
+         .order_by(SubmissionAnswer.question_id)),
+        ("add_question: max order_idx",
+         select(func.max(Question.order_idx)).where(Question.exam_id == 1)),
+        ("move_question: neighbour",
+         select(Question.id)
+         .where(Question.exam_id == 1, Question.order_idx == 2)),
+        ("render: options of questions",
+         select(Option.id).where(Option.question_id.in_([1, 2, 3]))),
+    ]
+
+
+def explain_hot_queries():
+    """EXPLAIN từng query nóng -> list (tên, plan, dùng index?).
+
+    Với SQLite: mọi bước đụng tới bảng phải là SEARCH (không SCAN cả bảng).
+    Dialect khác: trả plan thô, `uses_index` dựa trên chữ "Index" trong plan.
+    """
+    dialect = db.engine.dialect
+    results = []
+    for name, stmt in hot_queries():
+        sql = str(stmt.compile(dialect=dialect,
+                               compile_kwargs={"literal_binds": True}))
+        if dialect.name == "sqlite":
+            rows = db.session.execute(db.text("EXPLAIN QUERY PLAN " + sql)).all()
+            plan = [r[-1] for r in rows]
+            uses_index = all(not line.startswith("SCAN ")
+                             for line in plan if not line.startswith("USE TEMP"))
+        else:
+            rows = db.session.execute(db.text("EXPLAIN " + sql)).all()
+            plan = [r[0] for r in rows]
+            uses_index = any("Index" in line for line in plan)
+        results.append((name, plan, uses_index))
+    return results
@@ -1,5 +1,6 @@
 from flask_login import UserMixin
 from datetime import datetime
+from typing import NamedTuple
 from .extensions import db
 
 
@@ -25,26 +26,40 @@ class Exam(db.Model):
     )
     max_attempts = db.Column(db.Integer, default=1)  # 0 = unlimited
     class_id = db.Column(db.Integer, db.ForeignKey("class.id"), nullable=True)
+    # tăng mỗi khi câu hỏi/đáp án đổi – key của cache đáp án, HTML đề (app/cache.py)
+    content_version = db.Column(db.Integer, nullable=False, default=0,
+                                server_default="0")
 
 
 class Question(db.Model):
     id          = db.Column(db.Integer, primary_key=True)
     text        = db.Column(db.Text, nullable=True)
+    text_html   = db.Column(db.Text)                      # md_safe(text)
     image_path  = db.Column(db.String(255))
     exam_id     = db.Column(db.Integer, db.ForeignKey("exam.id"), nullable=False)
     order_idx   = db.Column(db.Integer, default=0)        # NEW
     options     = db.relationship("Option", backref="question",
-                                  cascade="all, delete-orphan", lazy=True)
+                                  cascade="all, delete-orphan", lazy=True,
+                                  order_by="Option.id")
+
+    __table_args__ = (
+        db.Index("ix_question_exam_order", "exam_id", "order_idx"),
+    )
 
 
 class Option(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     text = db.Column(db.String(255), nullable=False)
+    text_html = db.Column(db.Text)                    # md_safe(text)
     is_correct = db.Column(db.Boolean, default=False)
     question_id = db.Column(db.Integer, db.ForeignKey("question.id"),
                             nullable=False)
     image_path = db.Column(db.String(255))
 
+    __table_args__ = (
+        db.Index("ix_option_question", "question_id"),
+    )
+
 
 class Submission(db.Model):
     id          = db.Column(db.Integer, primary_key=True)
@@ -54,6 +69,7 @@ class Submission(db.Model):
     start_time  = db.Column(db.DateTime)
     end_time    = db.Column(db.DateTime)
     created_at  = db.Column(db.DateTime, default=datetime.utcnow)
+    saved_at    = db.Column(db.DateTime)          # lần autosave gần nhất
 
     # quan hệ đã có
     user = db.relationship("User", backref="submissions")
@@ -67,6 +83,15 @@ class Submission(db.Model):
         lazy=True
     )
 
+    __table_args__ = (
+        # start_exam / submit: lượt pending theo user + exam
+        db.Index("ix_submission_user_exam_score", "user_id", "exam_id", "score"),
+        # view_submissions: bài đã chấm của một đề
+        db.Index("ix_submission_exam_score", "exam_id", "score"),
+        # view_submissions: sort mặc định Ended ↓
+        db.Index("ix_submission_exam_end", "exam_id", "end_time"),
+    )
+
 
 class SubmissionAnswer(db.Model):
     id            = db.Column(db.Integer, primary_key=True)
@@ -81,6 +106,31 @@ class SubmissionAnswer(db.Model):
     question = db.relationship("Question")
     selected = db.relationship("Option", foreign_keys=[selected_id])
 
+    __table_args__ = (
+        db.Index("ix_submission_answer_submission",
+                 "submission_id", "question_id"),
+    )
+
+
+class UserExamStats(db.Model):
+    """Tổng hợp sẵn theo (user, đề) – ghi trong cùng transaction với Submission.
+
+    Xem app/stats.py. Dựng lại từ Submission: ``flask db rebuild-stats``.
+    """
+    __tablename__ = "user_exam_stats"
+
+    user_id           = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    exam_id           = db.Column(db.Integer, db.ForeignKey("exam.id"), primary_key=True)
+    attempts_used     = db.Column(db.Integer, nullable=False, default=0)  # kể cả lượt pending
+    best_score        = db.Column(db.Integer)
+    last_submitted_at = db.Column(db.DateTime)
+    pending_id        = db.Column(db.Integer)     # lượt đang làm dở mới nhất
+
+    user = db.relationship("User", backref=db.backref(
+        "exam_stats", cascade="all, delete-orphan", lazy=True))
+    exam = db.relationship("Exam", backref=db.backref(
+        "user_stats", cascade="all, delete-orphan", lazy=True))
+
 
 class Class(db.Model):
     id   = db.Column(db.Integer, primary_key=True)
@@ -96,9 +146,59 @@ class Class(db.Model):
     )
 
 
+def elapsed_seconds():
+    """Biểu thức SQL: số giây làm bài (end_time - start_time), -1 nếu thiếu."""
+    start, end = Submission.start_time, Submission.end_time
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        expr = db.func.extract("epoch", end - start)
+    elif dialect in ("mysql", "mariadb"):
+        expr = db.func.timestampdiff(db.literal_column("SECOND"), start, end)
+    else:  # sqlite
+        expr = db.func.round(
+            (db.func.julianday(end) - db.func.julianday(start)) * 86400)
+    return db.func.coalesce(db.cast(expr, db.Integer), -1)
+
+
+class ExamOverview(NamedTuple):
+    id: int
+    title: str
+    duration_minutes: int
+    attempts_left: int | None        # None = không giới hạn
+    best_score: int | None
+    pending_id: int | None           # lượt đang làm dở (nếu có)
+
+
+def exam_overview(user_id, class_id):
+    """Mọi đề của lớp kèm số lượt đã dùng, điểm cao nhất, lượt pending – 1 query.
+
+    Mỗi đề chỉ đọc một dòng UserExamStats theo khoá chính, không quét Submission.
+    """
+    rows = (db.session.query(
+                Exam.id, Exam.title, Exam.duration_minutes, Exam.max_attempts,
+                UserExamStats.attempts_used, UserExamStats.best_score,
+                UserExamStats.pending_id)
+            .outerjoin(UserExamStats, db.and_(UserExamStats.exam_id == Exam.id,
+                                              UserExamStats.user_id == user_id))
+            .filter(Exam.class_id == class_id)
+            .order_by(Exam.id)
+            .all())
+    return [ExamOverview(id=eid, title=title, duration_minutes=duration,
+                         attempts_left=_left(max_attempts, used or 0),
+                         best_score=best, pending_id=pending)
+            for eid, title, duration, max_attempts, used, best, pending in rows]
+
+
+def _left(max_attempts, used):
+    return None if max_attempts == 0 else max(max_attempts - used, 0)
+
+
 def attempts_used(exam, user):
-    return Submission.query.filter_by(exam=exam, user=user).count()
+    """Số lượt đã dùng (kể cả lượt đang làm) – đọc một dòng theo khoá chính."""
+    return db.session.execute(
+        db.select(UserExamStats.attempts_used)
+        .where(UserExamStats.user_id == user.id,
+               UserExamStats.exam_id == exam.id)).scalar() or 0
 
 def attempts_left(exam, user):
-    used = attempts_used(exam, user)
-    return None if exam.max_attempts == 0 else max(exam.max_attempts - used, 0)
+    return _left(exam.max_attempts, attempts_used(exam, user))
@@ -0,0 +1,186 @@
+"""Tạo tài khoản học sinh hàng loạt từ CSV / JSON.
+
+CSV – header ``username,password,class`` (``password`` / ``class`` tuỳ chọn)::
+
+    username,password,class
+    an.nguyen,Matkhau#1,10A1
+    binh.tran,,10A1                  # trống -> sinh mật khẩu ngẫu nhiên
+
+JSON – list (hoặc {"users": [...]}) các object cùng khoá.
+
+Khác với nhập câu hỏi, dòng lỗi (trùng username, lớp không tồn tại...) chỉ bị
+bỏ qua; các dòng hợp lệ vẫn được tạo. Kết quả trả về từng dòng.
+
+Hash mật khẩu (scrypt, cố tình chậm) chạy song song trên process pool; kiểm tra
+trùng username bằng một query; insert executemany theo lô.
+"""
+import csv
+import io
+import json
+import multiprocessing
+import os
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+from flask import current_app
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
+
+from .extensions import db
+from .models import User, Class
+from .importer import ImportFormatError
+
+USERNAME_MAX_LEN = 80          # User.username = String(80)
+INSERT_BATCH = 500
+POOL_MIN_ROWS = 8              # ít dòng hơn: hash ngay, không bõ mở pool
+
+
+class RowResult(NamedTuple):
+    line: int                  # số dòng trong file (CSV: tính cả header)
+    username: str
+    status: str                # "created" | "error"
+    message: str = ""
+    password: str = ""         # chỉ có khi mật khẩu do hệ thống sinh
+
+
+# ---------- parse ----------
+def parse_csv(data):
+    try:
+        reader = csv.DictReader(io.StringIO(data.decode("utf-8-sig")))
+    except UnicodeDecodeError as exc:
+        raise ImportFormatError(f"CSV phải là UTF-8: {exc}")
+    if "username" not in (reader.fieldnames or []):
+        raise ImportFormatError("CSV cần cột username (password, class tuỳ chọn)")
+    return [(line, {k: (v or "").strip() for k, v in row.items() if k})
+            for line, row in enumerate(reader, start=2)]
+
+
+def parse_json(data):
+    try:
+        doc = json.loads(data.decode("utf-8-sig"))
+    except (UnicodeDecodeError, ValueError) as exc:
+        raise ImportFormatError(f"JSON không hợp lệ: {exc}")
+    if isinstance(doc, dict):
+        doc = doc.get("users")
+    if not isinstance(doc, list):
+        raise ImportFormatError("JSON phải là list user hoặc {\"users\": [...]}")
+    rows = []
+    for n, raw in enumerate(doc, start=1):
+        if not isinstance(raw, dict):
+            raw = {}
+        rows.append((n, {k: str(raw.get(k) or "").strip()
+                         for k in ("username", "password", "class")}))
+    return rows
+
+
+PARSERS = {"csv": parse_csv, "json": parse_json}
+
+
+# ---------- hash ----------
+def hash_passwords(passwords, workers=None):
+    """generate_password_hash cho cả list, song song trên nhiều process."""
+    passwords = list(passwords)
+    workers = workers or os.cpu_count() or 1
+    if len(passwords) < POOL_MIN_ROWS or workers == 1:
+        return [generate_password_hash(p) for p in passwords]
+    # spawn: không fork tiến trình đang có thread (hàng đợi nộp bài, ảnh...)
+    ctx = multiprocessing.get_context("spawn")
+    chunk = max(1, len(passwords) // (4 * workers))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        return list(pool.map(generate_password_hash, passwords, chunksize=chunk))
+
+
+# ---------- ghi ----------
+def import_users(fmt, data, default_class_id=None, workers=None):
+    """Parse + kiểm tra + tạo tài khoản. -> list RowResult theo thứ tự file."""
+    parser = PARSERS.get(fmt)
+    if parser is None:
+        raise ImportFormatError(f"định dạng {fmt!r} không hỗ trợ (csv/json)")
+    rows = parser(data)
+    if workers is None:
+        workers = current_app.config.get("HASH_WORKERS")
+
+    # username đã có: một query IN (chia lô nếu file rất lớn); lớp: một query
+    wanted = {r["username"].lower() for _, r in rows if r.get("username")}
+    taken = set()
+    names = list(wanted)
+    for i in range(0, len(names), INSERT_BATCH):      # giới hạn số tham số IN
+        taken.update(u.lower() for (u,) in db.session.query(User.username).filter(
+            db.func.lower(User.username).in_(names[i:i + INSERT_BATCH])))
+    classes = {name.lower(): cid for cid, name in
+               db.session.query(Class.id, Class.name)}
+
+    results, pending = {}, []       # pending: (line, username, password, class_id, generated)
+    seen = set()
+    for line, row in rows:
+        username = row.get("username", "")
+        class_name = row.get("class", "")
+        key = username.lower()
+        error = None
+        if not username:
+            error = "thiếu username"
+        elif len(username) > USERNAME_MAX_LEN:
+            error = f"username dài quá {USERNAME_MAX_LEN} ký tự"
+        elif key in taken:
+            error = "username đã tồn tại"
+        elif key in seen:
+            error = "username trùng với dòng trước trong file"
+        elif class_name and class_name.lower() not in classes:
+            error = f"không có lớp {class_name!r}"
+        if error:
+            results[line] = RowResult(line, username, "error", error)
+            continue
+
+        seen.add(key)
+        password = row.get("password", "")
+        generated = not password
+        if generated:
+            password = secrets.token_urlsafe(9)
+        class_id = classes[class_name.lower()] if class_name else default_class_id
+        pending.append((line, username, password, class_id, generated))
+
+    hashes = hash_passwords([p[2] for p in pending], workers)
+    for start in range(0, len(pending), INSERT_BATCH):
+        batch = pending[start:start + INSERT_BATCH]
+        hashed = hashes[start:start + INSERT_BATCH]
+        for item, ok in zip(batch, _insert_batch(batch, hashed)):
+            line, username, password, _, generated = item
+            if ok is True:
+                results[line] = RowResult(line, username, "created",
+                                          password=password if generated else "")
+            else:
+                results[line] = RowResult(line, username, "error", ok)
+    return [results[line] for line in sorted(results)]
+
+
+def _insert_batch(batch, hashed):
+    """Insert một lô; trùng username do request khác chen vào -> thử từng dòng."""
+    rows = [{"username": username, "password_hash": h,
+             "class_id": class_id, "is_admin": False}
+            for (_, username, _, class_id, _), h in zip(batch, hashed)]
+    try:
+        db.session.execute(insert(User), rows)
+        db.session.commit()
+        return [True] * len(rows)
+    except IntegrityError:
+        db.session.rollback()
+
+    out = []
+    for row in rows:
+        try:
+            db.session.execute(insert(User), [row])
+            db.session.commit()
+            out.append(True)
+        except IntegrityError:
+            db.session.rollback()
+            out.append("username đã tồn tại")
+    return out
+
+
+def write_report(results, fileobj):
+    """Ghi báo cáo CSV (line, username, status, message, password)."""
+    writer = csv.writer(fileobj)
+    writer.writerow(RowResult._fields)
+    writer.writerows(results)
@@ -0,0 +1,296 @@
+"""Session phía server: cookie chỉ chứa id ngẫu nhiên, dữ liệu nằm trong store.
+
+Bật bằng ``SESSION_BACKEND``:
+
+* ``"sqlite"`` – một file SQLite (WAL) dùng chung cho mọi worker
+  (``SESSION_SQLITE_PATH``).
+* ``"file"``   – mỗi session một file trong ``SESSION_FILE_DIR``.
+* ``"module:Class"`` – backend tự viết (Redis...) cài ``SessionStore``.
+* ``"cookie"`` / ``None`` – cookie ký của Flask như cũ.
+
+Dữ liệu serialize bằng TaggedJSONSerializer của Flask (giống cookie session).
+Store chỉ được ghi khi session đổi, hoặc khi đã trôi quá nửa thời hạn (gia hạn
+trượt). Entry hết hạn được dọn định kỳ bởi một thread nền
+(``SESSION_CLEANUP_INTERVAL`` giây) và bằng ``flask sessions cleanup``.
+
+create_app không đụng tới store: store được mở (tạo file / bảng) ở lần đầu cần
+tới, thread dọn dẹp khởi động ở request đầu tiên (app/background.py).
+"""
+import importlib
+import os
+import re
+import secrets
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+_serializer = TaggedJSONSerializer()
+_SID_RE = re.compile(r"^[A-Za-z0-9_-]{43}$")     # secrets.token_urlsafe(32)
+
+
+# ---------- store ----------
+class SessionStore(ABC):
+    """Giao diện backend. Giá trị là str đã serialize; `expires` = epoch giây."""
+
+    @abstractmethod
+    def load(self, sid):
+        """-> str hoặc None (không có / đã hết hạn)."""
+
+    @abstractmethod
+    def save(self, sid, value, expires):
+        ...
+
+    @abstractmethod
+    def delete(self, sid):
+        ...
+
+    @abstractmethod
+    def cleanup(self, now=None):
+        """Xoá entry hết hạn. -> số entry đã xoá."""
+
+
+class SQLiteSessionStore(SessionStore):
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS session_store (
+        id      TEXT PRIMARY KEY,
+        data    TEXT NOT NULL,
+        expires REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS ix_session_store_expires ON session_store (expires);
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._schema_ready = False             # tạo bảng ở lần kết nối đầu tiên
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")   # mất session khi mất điện: chấp nhận
+            if not self._schema_ready:
+                conn.executescript(self._SCHEMA)        # idempotent
+                self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def load(self, sid):
+        row = self._conn().execute(
+            "SELECT data FROM session_store WHERE id = ? AND expires > ?",
+            (sid, time.time())).fetchone()
+        return row[0] if row else None
+
+    def save(self, sid, value, expires):
+        self._conn().execute(
+            "INSERT INTO session_store (id, data, expires) VALUES (?, ?, ?)"
+            " ON CONFLICT(id) DO UPDATE SET data = excluded.data,"
+            " expires = excluded.expires",
+            (sid, value, expires))
+
+    def delete(self, sid):
+        self._conn().execute("DELETE FROM session_store WHERE id = ?", (sid,))
+
+    def cleanup(self, now=None):
+        cur = self._conn().execute("DELETE FROM session_store WHERE expires <= ?",
+                                   (now or time.time(),))
+        return cur.rowcount
+
+
+class FileSessionStore(SessionStore):
+    """Mỗi session một file `<dir>/<sid>`: dòng đầu = expires, phần sau = data."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, sid):
+        return os.path.join(self.directory, sid)
+
+    def load(self, sid):
+        try:
+            with open(self._path(sid), encoding="utf-8") as fh:
+                expires = float(fh.readline())
+                data = fh.read()
+        except (OSError, ValueError):
+            return None
+        return data if expires > time.time() else None
+
+    def save(self, sid, value, expires):
+        path = self._path(sid)
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(f"{expires}\n{value}")
+        os.replace(tmp, path)
+
+    def delete(self, sid):
+        try:
+            os.remove(self._path(sid))
+        except OSError:
+            pass
+
+    def cleanup(self, now=None):
+        now = now or time.time()
+        removed = 0
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return 0
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                if name.endswith(".tmp"):
+                    expired = now - os.path.getmtime(path) > 3600
+                else:
+                    with open(path, encoding="utf-8") as fh:
+                        expired = float(fh.readline()) <= now
+                if expired:
+                    os.remove(path)
+                    removed += 1
+            except (OSError, ValueError):
+                continue
+        return removed
+
+
+# ---------- session ----------
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, expires=None):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.expires = expires               # hạn đang lưu trong store (None = mới)
+        self.user_id = (initial or {}).get("_user_id")
+        self.modified = False
+
+
+class ServerSessionInterface(SessionInterface):
+    """`make_store()` chỉ được gọi ở lần đầu cần store (request hoặc CLI)."""
+
+    def __init__(self, make_store, cleanup_interval=None):
+        self._make_store = make_store
+        self._store = None
+        self._cleanup_interval = cleanup_interval
+        self._cleaner = None
+        self._lock = threading.Lock()
+
+    @property
+    def store(self):
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    self._store = self._make_store()
+        return self._store
+
+    def start_cleaner(self, app):
+        if not self._cleanup_interval:
+            return
+        store = self.store                     # mở trước khi giữ _lock (không reentrant)
+        with self._lock:
+            if self._cleaner is None:
+                self._cleaner = threading.Thread(
+                    target=_cleanup_loop,
+                    args=(store, self._cleanup_interval, app.logger),
+                    name="session-cleanup", daemon=True)
+                self._cleaner.start()
+
+    def _lifetime(self, app):
+        return app.permanent_session_lifetime.total_seconds()
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid and _SID_RE.match(sid):
+            raw = self.store.load(sid)
+            if raw is not None:
+                try:
+                    data = _serializer.loads(raw)
+                except ValueError:
+                    data = None
+                if isinstance(data, dict):
+                    expires = data.pop("_expires", None)
+                    return ServerSession(data, sid=sid, expires=expires)
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.sid and session.modified:        # session bị xoá hết
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        # đổi user (đăng nhập / đăng xuất) -> cấp id mới, chống session fixation
+        if session.sid and session.get("_user_id") != session.user_id:
+            self.store.delete(session.sid)
+            session.sid = None
+
+        now = time.time()
+        lifetime = self._lifetime(app)
+        stale = session.expires is None or session.expires - now < lifetime / 2
+        if session.sid and not session.modified and not stale:
+            return
+
+        if not session.sid:
+            session.sid = secrets.token_urlsafe(32)
+        session.expires = now + lifetime
+        self.store.save(session.sid,
+                        _serializer.dumps({**session, "_expires": session.expires}),
+                        session.expires)
+        response.set_cookie(
+            name, session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain, path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app))
+
+
+# ---------- khởi tạo ----------
+def _make_store(app, backend):
+    if backend == "sqlite":
+        return SQLiteSessionStore(app.config["SESSION_SQLITE_PATH"])
+    if backend == "file":
+        return FileSessionStore(app.config["SESSION_FILE_DIR"])
+    module, _, cls = backend.partition(":")
+    return getattr(importlib.import_module(module), cls)(app)
+
+
+def _cleanup_loop(store, interval, logger):
+    while True:
+        time.sleep(interval)
+        try:
+            removed = store.cleanup()
+            if removed:
+                logger.info("sessions: đã xoá %d session hết hạn", removed)
+        except Exception:
+            logger.exception("dọn session thất bại")
+
+
+def init_app(app):
+    from . import background
+    backend = app.config.get("SESSION_BACKEND")
+    if not backend or backend == "cookie":
+        return
+    interface = ServerSessionInterface(lambda: _make_store(app, backend),
+                                       app.config.get("SESSION_CLEANUP_INTERVAL"))
+    app.session_interface = interface
+    background.register(app, interface.start_cleaner)
+
+
+def store_for(app):
+    """Store đang dùng của app, mở nếu chưa (None nếu dùng cookie session)."""
+    interface = app.session_interface
+    return interface.store if isinstance(interface, ServerSessionInterface) else None
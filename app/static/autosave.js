@@ -0,0 +1,61 @@
+/* Autosave đáp án: gom các lần chọn, gửi delta {question_id: option_id}
+   sau `delayMs` không đổi gì (tối đa `maxWaitMs` kể từ thay đổi đầu tiên). */
+function startAutosave(form, url, saved, delayMs, maxWaitMs) {
+  // resume: điền lại đáp án đã lưu
+  for (const [q, opt] of Object.entries(saved || {})) {
+    const el = form.querySelector(`input[name="question_${q}"][value="${opt}"]`);
+    if (el) el.checked = true;
+  }
+
+  let pending = {};
+  let timer = null;
+  let firstChange = 0;
+  let inflight = false;
+  let stopped = false;
+
+  const flush = () => {
+    clearTimeout(timer);
+    timer = null;
+    if (stopped || inflight || !Object.keys(pending).length) return;
+    const body = pending;
+    pending = {};
+    firstChange = 0;
+    inflight = true;
+    fetch(url, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify(body),
+      credentials: "same-origin",
+      keepalive: true,
+    })
+      .then((r) => {
+        if (r.status === 409) stopped = true;      // lượt đã kết thúc
+        else if (!r.ok) throw new Error(r.status);
+      })
+      .catch(() => { pending = Object.assign(body, pending); })  // gửi lại lần sau
+      .finally(() => {
+        inflight = false;
+        if (Object.keys(pending).length) schedule();
+      });
+  };
+
+  const schedule = () => {
+    const now = Date.now();
+    if (!firstChange) firstChange = now;
+    clearTimeout(timer);
+    const wait = Math.min(delayMs, Math.max(0, firstChange + maxWaitMs - now));
+    timer = setTimeout(flush, wait);
+  };
+
+  form.addEventListener("change", (e) => {
+    const m = /^question_(\d+)$/.exec(e.target.name || "");
+    if (!m) return;
+    pending[m[1]] = e.target.value;
+    schedule();
+  });
+
+  form.addEventListener("submit", () => { stopped = true; });
+  document.addEventListener("visibilitychange", () => {
+    if (document.visibilityState === "hidden") flush();
+  });
+}
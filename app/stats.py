@@ -0,0 +1,99 @@
+"""Bảng tổng hợp ``user_exam_stats``: (user, đề) -> số lượt, điểm cao nhất...
+
+Kiểm tra số lượt khi bắt đầu thi và trang chủ học sinh chỉ đọc một dòng theo
+khoá chính, dù học sinh đã làm bao nhiêu lượt. Bảng được cập nhật trong *cùng*
+transaction với thay đổi Submission tương ứng:
+
+* ``started``   – tạo lượt mới (start_exam, fallback của submit_exam).
+* ``finished``  – chấm xong một lượt (nộp, huỷ, worker hàng đợi chấm).
+* ``recompute`` – xoá một bản ghi kết quả (tính lại từ Submission).
+
+Xoá user / đề (kể cả cascade Class -> Exam) xoá luôn các dòng tổng hợp qua
+relationship. Dữ liệu cũ / lệch: ``flask db rebuild-stats``.
+
+Không dùng ``ON CONFLICT`` / ``ON DUPLICATE KEY`` (mỗi dialect một kiểu):
+UPDATE trước, chưa có dòng thì INSERT trong savepoint.
+"""
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from .extensions import db
+
+
+def _table():
+    from .models import UserExamStats
+    return UserExamStats.__table__
+
+
+def _where(t, user_id, exam_id):
+    return (t.c.user_id == user_id) & (t.c.exam_id == exam_id)
+
+
+def started(user_id, exam_id, sub_id):
+    """Lượt mới `sub_id` vừa được flush: +1 lượt, ghi nhận lượt pending."""
+    t = _table()
+    stmt = (update(t).where(_where(t, user_id, exam_id))
+            .values(attempts_used=t.c.attempts_used + 1, pending_id=sub_id))
+    if db.session.execute(stmt).rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(t).values(
+                user_id=user_id, exam_id=exam_id,
+                attempts_used=1, pending_id=sub_id))
+    except IntegrityError:                 # request song song vừa insert
+        db.session.execute(stmt)
+
+
+def finished(user_id, exam_id, sub_id, score, end_time):
+    """Lượt `sub_id` vừa được chấm `score` (sau khi đã claim Submission)."""
+    t = _table()
+    res = db.session.execute(
+        update(t).where(_where(t, user_id, exam_id))
+        .values(best_score=case((t.c.best_score.is_(None), score),
+                                (t.c.best_score < score, score),
+                                else_=t.c.best_score),
+                last_submitted_at=case(
+                    (t.c.last_submitted_at.is_(None), end_time),
+                    (t.c.last_submitted_at < end_time, end_time),
+                    else_=t.c.last_submitted_at),
+                pending_id=case((t.c.pending_id == sub_id, None),
+                                else_=t.c.pending_id)))
+    if not res.rowcount:                   # dòng chưa có (DB cũ chưa rebuild)
+        recompute(user_id, exam_id)
+
+
+def _aggregate():
+    """SELECT user_id, exam_id, attempts_used, best_score, last_submitted_at, pending_id."""
+    from .models import Submission
+    return (select(Submission.user_id, Submission.exam_id,
+                   func.count(Submission.id),
+                   func.max(Submission.score),
+                   func.max(case((Submission.score.is_not(None), Submission.end_time))),
+                   func.max(case((Submission.score.is_(None), Submission.id))))
+            .group_by(Submission.user_id, Submission.exam_id))
+
+
+_COLUMNS = ("user_id", "exam_id", "attempts_used", "best_score",
+            "last_submitted_at", "pending_id")
+
+
+def recompute(user_id, exam_id):
+    """Tính lại một cặp từ Submission (xoá dòng nếu không còn lượt nào)."""
+    from .models import Submission
+    t = _table()
+    db.session.execute(delete(t).where(_where(t, user_id, exam_id)))
+    row = db.session.execute(_aggregate().where(
+        Submission.user_id == user_id, Submission.exam_id == exam_id)).first()
+    if row:
+        db.session.execute(insert(t).values(dict(zip(_COLUMNS, row))))
+
+
+def rebuild():
+    """Dựng lại toàn bộ bảng từ Submission (một INSERT ... SELECT). -> số dòng."""
+    t = _table()
+    db.session.execute(delete(t))
+    db.session.execute(insert(t).from_select(list(_COLUMNS), _aggregate()))
+    count = db.session.execute(select(func.count()).select_from(t)).scalar()
+    db.session.commit()
+    return count
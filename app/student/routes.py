@@ -1,14 +1,17 @@
+import time
 from datetime import datetime, timedelta
 from flask import (render_template, redirect, url_for, request,
-                   flash, session)
+                   flash, make_response, current_app, abort)
 from flask_login import (login_user, logout_user,
                          login_required, current_user)
 from werkzeug.security import generate_password_hash, check_password_hash
-from dateutil import parser as dtparse
+from sqlalchemy import update
 
 from . import student_bp
 from ..extensions import db
-from ..models import User, Exam, Option, Submission, SubmissionAnswer, attempts_left
+from ..models import User, Exam, Submission, attempts_left, exam_overview
+from ..cache import get_answer_key, exam_fragment
+from .. import ingest, autosave, stats, sweeper
 
 
 # ---------- Register ----------
@@ -61,55 +64,102 @@ def index():
     if current_user.is_admin:
         return redirect(url_for("admin.dashboard"))
 
-    exams = Exam.query.filter_by(class_id=current_user.class_id).all()
+    exams = exam_overview(current_user.id, current_user.class_id)
 
-    # ===== attempts còn lại =====
-    attempts = {e.id: attempts_left(e, current_user) for e in exams}
+    return render_template("exam_list.html", exams=exams)
 
-    # ===== điểm cao nhất =====
-    best = {e.id: "-" for e in exams}         # mặc định chưa thi
-    rows = (db.session.query(Submission.exam_id,
-                             db.func.max(Submission.score))
-            .filter_by(user_id=current_user.id)
-            .group_by(Submission.exam_id)
-            .all())
-    for exam_id, max_score in rows:
-        best[exam_id] = max_score           # int
 
-    return render_template("exam_list.html",
-                           exams=exams,
-                           attempts=attempts,
-                           best=best)
+# ---------- Take exam ----------
+AUTOSAVE_MAX_DELTA = 1000     # số câu tối đa trong một lần autosave
+
+
+def _pending_submission(exam_id):
+    """Lượt chưa nộp mới nhất của user hiện tại cho đề (None nếu không có)."""
+    return (Submission.query
+            .filter_by(user_id=current_user.id, exam_id=exam_id, score=None)
+            .order_by(Submission.id.desc()).first())
+
+
+def _claim(sub_id, end_dt):
+    """Chốt lượt thi (UPDATE ... WHERE score IS NULL) trước khi đụng tới đáp án.
+
+    -> False nếu lượt đã được chấm ở nơi khác. Xem app/autosave.py.
+    """
+    return db.session.execute(
+        update(Submission)
+        .where(Submission.id == sub_id, Submission.score.is_(None))
+        .values(end_time=end_dt)).rowcount > 0
+
+
+def _deadline_passed(sub, exam, now):
+    """Đã quá hạn chót (hết giờ + EXAM_GRACE_SECONDS)? -> hết giờ (datetime) hoặc None.
+
+    Quá hạn thì form gửi lên bị bỏ qua: chỉ tính đáp án đã autosave trước đó.
+    """
+    limit = sweeper.deadline(sub.start_time, exam.duration_minutes)
+    if limit and now > limit + timedelta(seconds=sweeper.grace()):
+        return limit
+    return None
+
+
+def _finish(sub, form, end_dt):
+    """Chấm lượt từ đáp án đã lưu + `form` và commit (huỷ bài / lượt quá giờ)."""
+    autosave.discard(sub.id)
+    if not _claim(sub.id, end_dt):
+        db.session.rollback()
+        return
+    key = get_answer_key(sub.exam_id)
+    correct, answers, replaced = autosave.final_answers(sub.id, key, form)
+    total = len(key.question_ids)
+    sub.score = int(100 * correct / total) if total else 0
+    autosave.write_answers(answers, replaced)
+    stats.finished(sub.user_id, sub.exam_id, sub.id, sub.score, end_dt)
+    db.session.commit()
 
 
-# ---------- Take exam ----------
 @student_bp.route("/exam/<int:exam_id>/start")
 @login_required
 def start_exam(exam_id):
     exam = Exam.query.get_or_404(exam_id)
-    exam.questions.sort(key=lambda q: q.order_idx)
-    
+
+    # đã có phiên chưa nộp? -> tiếp tục (lượt này đã được tính)
+    sub = _pending_submission(exam.id)
+    if sub and not ingest.is_queued(sub.id):
+        limit = _deadline_passed(sub, exam, datetime.utcnow())
+        if limit:                                   # quá giờ: chốt, không resume
+            _finish(sub, {}, limit)
+            sub = None
+
     # 0 = unlimited
-    if attempts_left(exam, current_user) == 0:
+    if not sub and attempts_left(exam, current_user) == 0:
         flash("Bạn đã hết lượt.", "warning")
         return redirect(url_for("student.index"))
 
-    # đã có phiên chưa nộp? -> tiếp tục
-    sub = (Submission.query
-           .filter_by(user=current_user, exam=exam, score=None)
-           .order_by(Submission.id.desc()).first())
+    if sub and ingest.is_queued(sub.id):
+        # bài đã nộp, đang chờ worker chấm
+        return redirect(url_for("student.submission_result", sub_id=sub.id))
 
-    if not sub:
-        sub = Submission(user=current_user,
+    if sub:
+        saved = autosave.saved_answers(sub.id)           # resume: điền lại đáp án
+    else:
+        sub = Submission(user_id=current_user.id,
                          exam=exam,
                          score=None,                     # pending
                          start_time=datetime.utcnow())
         db.session.add(sub)
+        db.session.flush()
+        stats.started(current_user.id, exam.id, sub.id)
         db.session.commit()
+        saved = {}
 
-    session[f"start_{exam_id}"] = sub.start_time.isoformat()
-    session[f"sub_id_{exam_id}"] = sub.id                    # nhớ id
-    return render_template("take_exam.html", exam=exam)
+    # đồng hồ đếm phần còn lại của lượt (resume không được cấp lại trọn giờ)
+    limit = sweeper.deadline(sub.start_time, exam.duration_minutes)
+    remaining = ((exam.duration_minutes or 0) * 60 if limit is None else
+                 max(int((limit - datetime.utcnow()).total_seconds()), 0))
+    return render_template("take_exam.html", exam=exam,
+                           questions_html=exam_fragment(exam.id),
+                           saved_answers=saved,
+                           remaining_seconds=remaining)
 
 
 @student_bp.route("/exam/<int:exam_id>/submit", methods=["POST"])
@@ -117,69 +167,124 @@ def start_exam(exam_id):
 def submit_exam(exam_id):
     exam = Exam.query.get_or_404(exam_id)
 
-    # Lấy bản ghi pending
-    sub_id = session.pop(f"sub_id_{exam_id}", None)
-    sub    = Submission.query.get_or_404(sub_id) if sub_id else None
-
-    # ---------- Tính điểm ----------
-    correct = 0
-    for q in exam.questions:
-        chosen = request.form.get(f"question_{q.id}")
-        if chosen and Option.query.get(int(chosen)).is_correct:
-            correct += 1
-    score = int(100 * correct / len(exam.questions)) if exam.questions else 0
-
-    start_iso = session.pop(f"start_{exam_id}", None)
-    start_dt  = dtparse.isoparse(start_iso) if start_iso else datetime.utcnow()
-    end_dt    = datetime.utcnow()
-
-    # ---------- Cập nhật bản pending ----------
-    if sub and sub.score is None:
-        sub.score = score
-        sub.end_time = end_dt
-    else:
-        # Fallback (không nên xảy ra)
-        sub = Submission(user=current_user,
+    # Lượt đang làm = bản ghi pending mới nhất của user cho đề này
+    sub = _pending_submission(exam.id)
+    if sub and ingest.is_queued(sub.id):          # bấm nộp lần hai
+        return redirect(url_for("student.submission_result", sub_id=sub.id))
+    end_dt = datetime.utcnow()
+
+    if sub is None:
+        # Fallback (không nên xảy ra): lượt đã bị huỷ / chưa từng bắt đầu
+        sub = Submission(user_id=current_user.id,
                          exam=exam,
-                         score=score,
-                         start_time=start_dt,
-                         end_time=end_dt)
+                         start_time=end_dt)
         db.session.add(sub)
         db.session.flush()
-
-    # ---------- Lưu đáp án ----------
-    for q in exam.questions:
-        chosen_id  = request.form.get(f"question_{q.id}")
-        chosen_opt = Option.query.get(int(chosen_id)) if chosen_id else None
-        db.session.add(SubmissionAnswer(
-            submission_id=sub.id,
-            question_id=q.id,
-            selected_id=chosen_opt.id if chosen_opt else None,
-            is_correct=bool(chosen_opt and chosen_opt.is_correct)
-        ))
-
+        stats.started(current_user.id, exam.id, sub.id)
+    start_dt = sub.start_time or end_dt
+    form = request.form
+    limit = _deadline_passed(sub, exam, end_dt)
+    if limit:
+        flash("Đã quá giờ làm bài – chỉ tính các đáp án đã lưu trước khi hết giờ.",
+              "warning")
+        form, end_dt = {}, limit
+
+    if ingest.enabled():
+        # ghi đáp án thô vào journal, worker nền chấm + commit theo lô
+        autosave.discard(sub.id)
+        db.session.commit()
+        ingest.enqueue(sub, form, end_dt)
+        return redirect(url_for("student.submission_result", sub_id=sub.id))
+
+    # ---------- Chấm + lưu phần đáp án còn lại: 1 lượt, 1 transaction ----------
+    autosave.discard(sub.id)                  # form đã có đủ, bỏ nháp chưa ghi
+    if not _claim(sub.id, end_dt):            # đã được chấm (tab khác / beacon huỷ)
+        db.session.rollback()
+        return redirect(url_for("student.submission_result", sub_id=sub.id))
+    key = get_answer_key(exam.id)
+    correct, answers, replaced = autosave.final_answers(sub.id, key, form)
+    total = len(key.question_ids)
+    score = int(100 * correct / total) if total else 0
+
+    sub.score = score
+    sub.end_time = end_dt
+
+    t0 = time.perf_counter()
+    autosave.write_answers(answers, replaced)
+    stats.finished(current_user.id, exam.id, sub.id, score, end_dt)
     db.session.commit()
+    write_ms = (time.perf_counter() - t0) * 1000
+    current_app.logger.info("submission %s: %d answers written in %.1f ms",
+                            sub.id, len(answers), write_ms)
 
     elapsed = (end_dt - start_dt).seconds
+    resp = make_response(render_template(
+        "result.html",
+        score=score,
+        total=total,
+        attempts_left=attempts_left(exam, current_user),
+        elapsed=elapsed))
+    resp.headers["Server-Timing"] = (
+        f'answers;desc="{len(answers)} rows";dur={write_ms:.1f}')
+    return resp
+
+
+@student_bp.route("/submission/<int:sub_id>/result")
+@login_required
+def submission_result(sub_id):
+    sub = Submission.query.get_or_404(sub_id)
+    if sub.user_id != current_user.id:
+        abort(404)
+
+    if sub.score is None:
+        if not ingest.is_queued(sub.id):
+            return redirect(url_for("student.index"))
+        return render_template("result_pending.html", sub=sub)   # tự reload
+
+    total = len(get_answer_key(sub.exam_id).question_ids)
+    elapsed = (sub.end_time - sub.start_time).seconds \
+        if sub.start_time and sub.end_time else 0
     return render_template("result.html",
-                           score=score,
-                           total=len(exam.questions),
-                           attempts_left=attempts_left(exam, current_user),
+                           score=sub.score,
+                           total=total,
+                           attempts_left=attempts_left(sub.exam, current_user),
                            elapsed=elapsed)
 
 
 @student_bp.route("/exam/<int:exam_id>/abort", methods=["POST"])
 @login_required
 def abort_exam(exam_id):
-    sub_id = session.pop(f"sub_id_{exam_id}", None)
-    if not sub_id:
+    # beacon gửi kèm form hiện tại: chấm phần đã làm (đã autosave + form)
+    sub = _pending_submission(exam_id)
+    if sub is None or ingest.is_queued(sub.id):   # không có lượt / đã nộp qua hàng đợi
         return "", 204
+    end_dt, form = datetime.utcnow(), request.form
+    limit = _deadline_passed(sub, sub.exam, end_dt)
+    if limit:
+        form, end_dt = {}, limit
+    _finish(sub, form, end_dt)
+    return "", 204
 
-    sub = Submission.query.get(sub_id)
-    if sub and sub.score is None:                 # vẫn pending
-        sub.score    = 0
-        sub.end_time = datetime.utcnow()
-        db.session.commit()
+
+@student_bp.route("/exam/<int:exam_id>/autosave", methods=["POST"])
+@login_required
+def autosave_answers(exam_id):
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or len(data) > AUTOSAVE_MAX_DELTA:
+        abort(400)
+    try:
+        deltas = {int(q_id): int(opt_id) for q_id, opt_id in data.items()}
+    except (TypeError, ValueError):
+        abort(400)
+
+    sub = _pending_submission(exam_id)
+    if (sub is None or ingest.is_queued(sub.id)
+            or _deadline_passed(sub, sub.exam, datetime.utcnow())):
+        return "", 409                            # lượt đã kết thúc: client ngừng gửi
+    autosave.record(sub.id, exam_id, deltas,
+                    max_pending=current_app.config.get("AUTOSAVE_MAX_PENDING"))
+    if autosave.write_through():
+        autosave.flush()
     return "", 204
 
 
@@ -190,7 +295,7 @@ def history():
         return redirect(url_for("admin.dashboard"))
 
     subs = (Submission.query
-            .filter_by(user=current_user)
+            .filter_by(user_id=current_user.id)
             .order_by(Submission.end_time.desc())
             .all())
 
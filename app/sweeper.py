@@ -0,0 +1,159 @@
+"""Chốt các lượt thi quá giờ mà không ai nộp.
+
+Beacon huỷ bài (take_exam.html) không phải lúc nào cũng tới: đóng máy, mất
+mạng... Lượt đó nằm ``score IS NULL`` mãi, bị start_exam resume lại và làm mọi
+lookup lượt pending chậm dần. Sweeper tìm lượt có
+``start_time + duration_minutes + EXAM_GRACE_SECONDS`` đã qua và chấm chúng từ
+đáp án đã autosave (chưa lưu gì -> 0 điểm).
+
+Nháp autosave nằm trong buffer của từng worker (app/autosave.py) tới lần flush
+kế tiếp; sweep chỉ flush được buffer của process mình, nên chờ thêm một chu kỳ
+``AUTOSAVE_FLUSH_SECONDS`` để các worker khác kịp ghi đáp án cuối xuống DB.
+
+Mỗi lô: claim bằng executemany ``UPDATE ... WHERE score IS NULL`` (cùng thứ tự
+khoá với nộp bài / autosave, xem app/autosave.py), rồi chấm bằng *một* UPDATE
+với subquery đếm SubmissionAnswer đúng. Lượt đang nằm trong hàng đợi chấm
+(app/ingest.py) được bỏ qua.
+
+Chạy bằng thread nền mỗi ``SWEEPER_INTERVAL`` giây (None/0 = tắt; thread khởi
+động ở request đầu tiên, xem app/background.py) hoặc ``flask exams sweep`` từ
+cron.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import bindparam, func, select, update
+
+from .extensions import db
+
+BATCH = 200
+_worker = None
+
+
+def deadline(start_time, duration_minutes, grace=0):
+    """Hạn chót của lượt (None = không giới hạn thời gian)."""
+    if not start_time or not duration_minutes:
+        return None
+    return start_time + timedelta(minutes=duration_minutes, seconds=grace)
+
+
+def grace():
+    """Số giây ân hạn sau khi hết giờ (độ trễ mạng, đồng hồ client lệch...)."""
+    return current_app.config.get("EXAM_GRACE_SECONDS", 120)
+
+
+def _sweep_batch(exam_id, duration, cutoff, after_id=0):
+    """Chốt các lượt quá hạn trong BATCH ứng viên kế tiếp (id > `after_id`) của một đề.
+
+    -> ([(sub_id, user_id)] đã chốt, id ứng viên cuối hoặc None nếu hết ứng viên).
+    Lượt đang trong hàng đợi bị bỏ qua nên số đã chốt có thể ít hơn BATCH dù
+    còn ứng viên phía sau: gọi tiếp với id trả về.
+    """
+    from . import ingest, stats
+    from .models import Question, Submission, SubmissionAnswer
+
+    candidates = db.session.execute(
+        select(Submission.id, Submission.start_time)
+        .where(Submission.exam_id == exam_id, Submission.score.is_(None),
+               Submission.start_time < cutoff, Submission.id > after_id)
+        .order_by(Submission.id).limit(BATCH)).all()
+    last_id = candidates[-1].id if len(candidates) == BATCH else None
+    queued = ingest.queued_ids([c.id for c in candidates])
+    candidates = [c for c in candidates if c.id not in queued]
+    if not candidates:
+        return [], last_id
+
+    # claim: end_time = hết giờ làm bài (không tính phần ân hạn)
+    table = Submission.__table__
+    db.session.execute(
+        update(table)
+        .where(table.c.id == bindparam("b_id"), table.c.score.is_(None))
+        .values(end_time=bindparam("b_end")),
+        [{"b_id": c.id, "b_end": deadline(c.start_time, duration)}
+         for c in candidates])
+    live = db.session.execute(
+        select(Submission.id, Submission.user_id, Submission.end_time)
+        .where(Submission.id.in_([c.id for c in candidates]),
+               Submission.score.is_(None))).all()
+    if not live:
+        return [], last_id
+
+    total = db.session.execute(
+        select(func.count(Question.id)).where(Question.exam_id == exam_id)).scalar()
+    correct = (select(func.count(SubmissionAnswer.id))
+               .where(SubmissionAnswer.submission_id == Submission.id,
+                      SubmissionAnswer.is_correct.is_(True))
+               .scalar_subquery())
+    db.session.execute(
+        update(Submission)
+        .where(Submission.id.in_([r.id for r in live]))
+        .values(score=(correct * 100) // total if total else 0),
+        execution_options={"synchronize_session": False})
+
+    scores = dict(db.session.execute(
+        select(Submission.id, Submission.score)
+        .where(Submission.id.in_([r.id for r in live]))).all())
+    for r in live:
+        stats.finished(r.user_id, exam_id, r.id, scores[r.id], r.end_time)
+    return [(r.id, r.user_id) for r in live], last_id
+
+
+def sweep(now=None):
+    """Chốt mọi lượt quá hạn, mỗi lô một transaction. -> số lượt đã chốt."""
+    from . import autosave
+    from .models import Exam
+
+    now = now or datetime.utcnow()
+    autosave.flush()                       # đáp án còn trong buffer của process này
+    # buffer của worker khác: chờ thêm một chu kỳ flush
+    wait = grace() + current_app.config.get("AUTOSAVE_FLUSH_SECONDS", 5)
+    exams = db.session.execute(
+        select(Exam.id, Exam.duration_minutes)
+        .where(Exam.duration_minutes > 0)).all()
+
+    swept = 0
+    for exam_id, duration in exams:
+        cutoff = now - timedelta(minutes=duration, seconds=wait)
+        last_id = 0
+        while last_id is not None:
+            try:
+                done, last_id = _sweep_batch(exam_id, duration, cutoff, last_id)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            for sub_id, _ in done:
+                autosave.discard(sub_id)
+            swept += len(done)
+    return swept
+
+
+def _sweep_loop(app, interval):
+    while True:
+        time.sleep(interval)
+        with app.app_context():
+            try:
+                swept = sweep()
+                if swept:
+                    app.logger.info("sweeper: đã chốt %d lượt quá giờ", swept)
+            except Exception:
+                app.logger.exception("sweeper error")
+            finally:
+                db.session.remove()
+
+
+def _start_worker(app):
+    global _worker
+    if _worker is None:
+        _worker = threading.Thread(target=_sweep_loop,
+                                   args=(app, app.config["SWEEPER_INTERVAL"]),
+                                   name="exam-sweeper", daemon=True)
+        _worker.start()
+
+
+def init_app(app):
+    from . import background
+    if app.config.get("SWEEPER_INTERVAL"):
+        background.register(app, _start_worker)
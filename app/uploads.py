@@ -0,0 +1,224 @@
+"""Kho ảnh upload đánh địa chỉ theo nội dung.
+
+Tên file = sha256 của nội dung: ``uploads/<sha256>.<ext>``. Cùng một ảnh
+upload nhiều lần (một hình vẽ dùng cho nhiều câu) chỉ lưu một file, và các
+biến thể WebP (app/images.py) cũng dùng chung.
+
+Tham chiếu tới file là các cột ``Question.image_path`` / ``Option.image_path``.
+Khi một dòng bị xoá (kể cả cascade Exam -> Question -> Option) hoặc đổi ảnh,
+đường dẫn cũ được ghi lại lúc flush và *nhả* sau commit: file nào không còn
+dòng nào trỏ tới thì bị xoá. ``flask uploads gc`` dọn phần còn sót (file cũ,
+import lỗi, tiến trình chết giữa chừng...).
+
+File vừa lưu/vừa dùng lại chưa chắc đã được commit, nên không bao giờ bị xoá
+trước ``UPLOAD_GC_GRACE_SECONDS`` kể từ lần ghi/chạm cuối (mtime).
+"""
+import hashlib
+import os
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import event, inspect as sa_inspect, select, union
+
+from . import images
+from .extensions import db
+
+PREFIX = "uploads/"
+_EXT_ALIASES = {"jpeg": "jpg"}
+
+_lock = threading.Lock()           # store() và release() trong cùng tiến trình
+
+
+def _abs(rel_path):
+    return os.path.join(current_app.static_folder, rel_path)
+
+
+def _grace():
+    return current_app.config.get("UPLOAD_GC_GRACE_SECONDS", 3600)
+
+
+# ---------- ghi ----------
+def store(data, ext, created=None):
+    """Lưu ảnh (dedup theo nội dung), trả về đường dẫn tương đối với static/.
+
+    `created` (dict, tuỳ chọn) nhận ``{đường dẫn: mtime}`` nếu lần gọi này tạo
+    file mới – để :func:`discard` xoá lại khi thao tác bị huỷ.
+    """
+    ext = _EXT_ALIASES.get(ext, ext)
+    digest = hashlib.sha256(data).hexdigest()
+    rel_path = f"{PREFIX}{digest}.{ext}"
+    path = _abs(rel_path)
+
+    with _lock:
+        if os.path.exists(path):
+            os.utime(path)             # dùng lại: làm mới mtime để GC chừa ra
+            is_new = False
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, path)      # không lộ file ghi dở
+            is_new = True
+            if created is not None:
+                created[rel_path] = os.path.getmtime(path)
+
+    if is_new or not os.path.exists(_abs(images.variant_path(rel_path, "thumb"))):
+        images.process_async(rel_path)  # tạo bản WebP nhỏ ở thread nền
+    return rel_path
+
+
+def _remove(rel_path):
+    images.delete_variants(rel_path)
+    try:
+        os.remove(_abs(rel_path))
+    except OSError:
+        pass                           # file đã xoá trước đó
+
+
+# ---------- tham chiếu ----------
+def referenced(conn, paths=None):
+    """Tập các image_path đang được Question/Option dùng (lọc theo `paths`)."""
+    from .models import Question, Option
+    q_stmt = select(Question.image_path).where(Question.image_path.is_not(None))
+    o_stmt = select(Option.image_path).where(Option.image_path.is_not(None))
+    if paths is not None:
+        paths = list(paths)
+        q_stmt = q_stmt.where(Question.image_path.in_(paths))
+        o_stmt = o_stmt.where(Option.image_path.in_(paths))
+    stmt = union(q_stmt, o_stmt)
+    return {row[0] for row in conn.execute(stmt)}
+
+
+def _is_stale(rel_path, now):
+    try:
+        return now - os.path.getmtime(_abs(rel_path)) >= _grace()
+    except OSError:
+        return False                   # không còn file: không cần làm gì
+
+
+def release(paths):
+    """Xoá các file trong `paths` không còn được tham chiếu (và đã quá hạn chờ)."""
+    paths = {p for p in paths if p and p.startswith(PREFIX)}
+    if not paths:
+        return []
+    removed = []
+    with _lock, db.engine.connect() as conn:
+        still_used = referenced(conn, paths)
+        now = time.time()
+        for path in sorted(paths - still_used):
+            if _is_stale(path, now):
+                _remove(path)
+                removed.append(path)
+    return removed
+
+
+def discard(created):
+    """Xoá ngay các file `created` (từ :func:`store`) của một thao tác đã rollback.
+
+    Bỏ qua file đã có dòng trỏ tới hoặc đã bị chạm lại (mtime đổi: một request
+    khác vừa dùng lại cùng nội dung) – phần đó để GC quyết định sau hạn chờ.
+    """
+    if not created:
+        return []
+    removed = []
+    with _lock, db.engine.connect() as conn:
+        still_used = referenced(conn, created)
+        for path, mtime in sorted(created.items()):
+            try:
+                untouched = os.path.getmtime(_abs(path)) == mtime
+            except OSError:
+                continue
+            if path not in still_used and untouched:
+                _remove(path)
+                removed.append(path)
+    return removed
+
+
+# ---------- theo dõi thay đổi qua session ----------
+def _image_owner(obj):
+    from .models import Question, Option
+    return isinstance(obj, (Question, Option))
+
+
+def _after_flush(session, flush_context):
+    released = session.info.setdefault("released_uploads", set())
+    for obj in session.deleted:
+        if _image_owner(obj) and obj.image_path:
+            released.add(obj.image_path)
+    for obj in session.dirty:
+        if _image_owner(obj):
+            released.update(p for p in sa_inspect(obj).attrs.image_path.history.deleted
+                            if p)
+
+
+def _after_commit(session):
+    released = session.info.pop("released_uploads", None)
+    if released:
+        try:
+            release(released)
+        except Exception:              # dọn dẹp thất bại không làm hỏng request
+            current_app.logger.exception("không nhả được ảnh upload")
+
+
+def _after_rollback(session):
+    session.info.pop("released_uploads", None)
+
+
+# ---------- GC ----------
+def _original_of(filename):
+    """`<stem>.<variant>.webp` -> `<stem>`; file gốc -> None."""
+    parts = filename.split(".")
+    if len(parts) == 3 and parts[1] in images.VARIANTS and parts[2] == "webp":
+        return parts[0]
+    return None
+
+
+def collect_garbage(dry_run=False):
+    """Xoá file gốc + biến thể không còn tham chiếu. -> (số file, số byte)."""
+    folder = _abs(PREFIX)
+    try:
+        names = os.listdir(folder)
+    except FileNotFoundError:
+        return 0, 0
+
+    originals, variants = {}, []
+    for name in names:
+        if _original_of(name) is None and not name.endswith(".tmp"):
+            originals[name.rsplit(".", 1)[0]] = name
+        else:
+            variants.append(name)
+
+    with _lock, db.engine.connect() as conn:
+        used = {p[len(PREFIX):] for p in referenced(conn) if p.startswith(PREFIX)}
+        now = time.time()
+        doomed = [name for name in originals.values()
+                  if name not in used and _is_stale(PREFIX + name, now)]
+        doomed_stems = {name.rsplit(".", 1)[0] for name in doomed}
+        # biến thể của file bị xoá, biến thể mồ côi, file .tmp ghi dở
+        doomed += [name for name in variants
+                   if _original_of(name) in doomed_stems
+                   or (_original_of(name) not in originals
+                       and _is_stale(PREFIX + name, now))]
+
+        count = size = 0
+        for name in doomed:
+            path = os.path.join(folder, name)
+            try:
+                size += os.path.getsize(path)
+                if not dry_run:
+                    os.remove(path)
+                    images.forget(PREFIX + name)
+                count += 1
+            except OSError:
+                pass
+    return count, size
+
+
+def init_app(app):
+    for name, fn in (("after_flush", _after_flush),
+                     ("after_commit", _after_commit),
+                     ("after_rollback", _after_rollback)):
+        if not event.contains(db.session, name, fn):   # create_app gọi nhiều lần
+            event.listen(db.session, name, fn)
@@ -1,8 +1,11 @@
 import os
+import hashlib
 from werkzeug.utils import secure_filename
-import markdown2, bleach
 from flask import current_app, flash
 
+from .cache import LRUCache
+from . import uploads
+
 def save_image(file_storage):
     if not file_storage or file_storage.filename == "":
         return None       # user không chọn ảnh
@@ -10,30 +13,32 @@ def save_image(file_storage):
     if ext not in current_app.config["ALLOWED_EXTENSIONS"]:
         flash("File type not allowed (png/jpg/jpeg/gif/webp/avif).", "warning")
         return None
-    fn = secure_filename(file_storage.filename)
-    # tránh đè file: gắn timestamp
-    import time, random, string
-    stem = f"{int(time.time())}_{''.join(random.choices(string.ascii_lowercase, k=4))}"
-    filename = f"{stem}.{ext}"
-    path = os.path.join(current_app.config["UPLOAD_FOLDER"], filename)
-    file_storage.save(path)
-    return f"uploads/{filename}"   # relative to static/
-
-
-def _delete_file(rel_path):
-    """Xoá file trong static/uploads nếu còn tồn tại."""
-    if not rel_path:
-        return
-    path = os.path.join(current_app.static_folder, rel_path)
-    try:
-        os.remove(path)
-    except OSError:
-        pass      # file đã xoá trước đó
+    return save_image_bytes(file_storage.read(), ext)
+
+
+def save_image_bytes(data, ext):
+    """Lưu ảnh vào kho uploads (dedup theo nội dung), trả về đường dẫn tương đối với static/."""
+    return uploads.store(data, ext)
+
+
+# HTML đã render, key = sha1 của markdown gốc
+_md_cache = LRUCache(maxsize=4096)
 
 
 def md_safe(raw: str | None) -> str:
+    raw = raw or ""
+    key = hashlib.sha1(raw.encode("utf-8")).digest()
+    html = _md_cache.get(key)
+    if html is None:
+        html = _render_md(raw)
+        _md_cache.set(key, html)
+    return html
+
+
+def _render_md(raw: str) -> str:
+    import markdown2, bleach           # nặng (~50 ms): import lúc render lần đầu
     html = markdown2.markdown(
-        raw or "",
+        raw,
         extras=[
             "break-on-newline",
             "fenced-code-blocks",   # ```python ... ```
@@ -0,0 +1,581 @@
+"""Benchmark vòng đời một lượt thi: danh sách đề -> bắt đầu -> nộp, và trang xem bài.
+
+    python -m benchmarks.bench_exam seed [--students 400 --questions 60 --history 25 ...]
+    python -m benchmarks.bench_exam run  [--mode client|http|both] [--workers 16]
+                                         [--json out.json] [--baseline base.json]
+
+``seed`` tạo một DB SQLite cỡ thật (mặc định 4 lớp, 400 học sinh, 8 đề x 60 câu,
+25 lượt cũ / học sinh / đề -> 1,2 triệu SubmissionAnswer) tại ``--db``; ``run``
+tự seed nếu chưa có. Mỗi lần ``run`` chạy trên một *bản sao* của DB seed nên
+kết quả lặp lại được.
+
+Hai chế độ:
+  client – Flask test client, tuần tự (đo chi phí của app, không có mạng)
+  http   – ``--workers`` thread học sinh + 1 thread admin gọi HTTP đồng thời
+           vào server cục bộ (werkzeug threaded, cùng process) hoặc ``--url``
+           (gunicorn... đã trỏ vào bản sao DB; số query khi đó chỉ của worker
+           trả lời /admin/metrics)
+
+Đo p50/p95/p99, throughput và số câu SQL / request (lấy từ /admin/metrics,
+app/metrics.py) cho student.index, student.start_exam, student.submit_exam,
+admin.view_submissions, admin.view_submission. ``--json`` ghi kết quả;
+``--baseline`` so với một file cũ và trả mã 1 nếu p95 tệ hơn ``--tolerance``
+hoặc số query tăng.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB = os.path.join(HERE, "bench-seed.db")
+PASSWORD = "bench"
+ADMIN = "bench_admin"
+ENDPOINTS = ("student.index", "student.start_exam", "student.submit_exam",
+             "admin.view_submissions", "admin.view_submission")
+SEED_KEYS = ("classes", "students", "exams", "questions", "options", "history", "rng")
+
+
+def _configure_env(db_path):
+    """Config đọc biến môi trường lúc import: đặt trước khi import app."""
+    tmp = tempfile.mkdtemp(prefix="bench-")
+    os.environ["DATABASE_URI"] = f"sqlite:///{db_path}"
+    os.environ.setdefault("SESSION_SQLITE_PATH", os.path.join(tmp, "sessions.db"))
+    os.environ.setdefault("SUBMIT_QUEUE_PATH", os.path.join(tmp, "submit_queue.db"))
+    return tmp
+
+
+# ---------- seed ----------
+def seed(args):
+    if os.path.exists(args.db):
+        os.remove(args.db)
+    _configure_env(args.db)
+    from sqlalchemy import insert
+    from werkzeug.security import generate_password_hash
+
+    from app import create_app, migrations, stats
+    from app.extensions import db
+    from app.models import (Class, Exam, Option, Question, Submission,
+                            SubmissionAnswer, User)
+    from app.utils import md_safe
+
+    rng = random.Random(args.rng)
+    t0 = time.perf_counter()
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        migrations.upgrade()
+        pw_hash = generate_password_hash(PASSWORD)     # một hash cho mọi tài khoản
+
+        db.session.execute(insert(Class), [{"id": c + 1, "name": f"Lớp {c + 1}"}
+                                           for c in range(args.classes)])
+        users = [{"username": ADMIN, "password_hash": pw_hash,
+                  "is_admin": True, "class_id": None}]
+        users += [{"username": f"hs{n:05d}", "password_hash": pw_hash,
+                   "is_admin": False, "class_id": n % args.classes + 1}
+                  for n in range(args.students)]
+        db.session.execute(insert(User), users)
+
+        exams, questions, options = [], [], []
+        key = {}                                   # exam_id -> [(q_id, [opt], đúng)]
+        q_id = opt_id = 0
+        for e in range(args.classes * args.exams):
+            exam_id = e + 1
+            exams.append({"id": exam_id, "title": f"Đề {exam_id}",
+                          "duration_minutes": 45, "max_attempts": 0,
+                          "class_id": e % args.classes + 1})
+            key[exam_id] = []
+            for n in range(args.questions):
+                q_id += 1
+                text = f"Câu {n + 1}: tính **{n} + {exam_id}** với $x_{{{n}}}$"
+                questions.append({"id": q_id, "exam_id": exam_id, "order_idx": n + 1,
+                                  "text": text, "text_html": md_safe(text)})
+                ids = []
+                for i in range(args.options):
+                    opt_id += 1
+                    ids.append(opt_id)
+                    text = f"Đáp án {i + 1} = {n * i}"
+                    options.append({"id": opt_id, "question_id": q_id, "text": text,
+                                    "text_html": md_safe(text), "is_correct": i == 0})
+                key[exam_id].append((q_id, ids, ids[0]))
+        db.session.execute(insert(Exam), exams)
+        db.session.execute(insert(Question), questions)
+        db.session.execute(insert(Option), options)
+        db.session.commit()
+
+        # lượt cũ: mỗi học sinh x mỗi đề của lớp x --history lượt
+        sub_id = 0
+        subs, answers = [], []
+        now = datetime.utcnow()
+        students = (db.session.query(User.id, User.class_id)
+                    .filter(User.is_admin.is_(False)).order_by(User.id).all())
+        for user_id, class_id in students:
+            for exam in exams:
+                if exam["class_id"] != class_id:
+                    continue
+                for _ in range(args.history):
+                    sub_id += 1
+                    start = now - timedelta(days=rng.randint(1, 365),
+                                            seconds=rng.randint(0, 86400))
+                    correct = 0
+                    for qid, ids, right in key[exam["id"]]:
+                        chosen = rng.choice(ids)
+                        correct += chosen == right
+                        answers.append({"submission_id": sub_id, "question_id": qid,
+                                        "selected_id": chosen, "is_correct": chosen == right})
+                    subs.append({"id": sub_id, "user_id": user_id, "exam_id": exam["id"],
+                                 "score": 100 * correct // len(key[exam["id"]]),
+                                 "start_time": start, "created_at": start,
+                                 "end_time": start + timedelta(seconds=rng.randint(300, 2700))})
+                    if len(answers) >= 50_000:
+                        _flush_history(db, insert, Submission, SubmissionAnswer,
+                                       subs, answers)
+        _flush_history(db, insert, Submission, SubmissionAnswer, subs, answers)
+        stats.rebuild()
+
+        meta = {k: getattr(args, k) for k in SEED_KEYS}
+        meta.update(submissions=sub_id, answers=sub_id * args.questions)
+        db.session.execute(db.text("CREATE TABLE bench_meta (data TEXT)"))
+        db.session.execute(db.text("INSERT INTO bench_meta VALUES (:d)"),
+                           {"d": json.dumps(meta)})
+        db.session.commit()
+    print(f"seed: {args.db} – {sub_id} lượt, {sub_id * args.questions} đáp án "
+          f"({time.perf_counter() - t0:.1f} s)")
+
+
+def _flush_history(db, insert, Submission, SubmissionAnswer, subs, answers):
+    if subs:
+        db.session.execute(insert(Submission), subs)
+    if answers:
+        db.session.execute(insert(SubmissionAnswer), answers)
+    db.session.commit()
+    subs.clear()
+    answers.clear()
+
+
+def _seed_meta(path):
+    import sqlite3
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            return json.loads(conn.execute("SELECT data FROM bench_meta").fetchone()[0])
+        finally:
+            conn.close()
+    except Exception:
+        return None
+
+
+def ensure_seed(args):
+    """Seed (ở process riêng) nếu DB chưa có hoặc khác tham số."""
+    meta = _seed_meta(args.db)
+    if meta and all(meta.get(k) == getattr(args, k) for k in SEED_KEYS):
+        return meta
+    cmd = [sys.executable, "-m", "benchmarks.bench_exam", "seed", "--db", args.db]
+    for k in SEED_KEYS:
+        cmd += [f"--{k}", str(getattr(args, k))]
+    subprocess.run(cmd, check=True, cwd=os.path.dirname(HERE))
+    return _seed_meta(args.db)
+
+
+# ---------- client ----------
+class TestClient:
+    """Flask test client với cùng giao diện như HttpClient."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        resp = self.client.open(path, method=method, data=data)
+        body = resp.get_data()
+        return resp.status_code, body
+
+
+class HttpClient:
+    """http.client + cookie tối giản; không theo redirect (đo đúng một request)."""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.conn = http.client.HTTPConnection(parts.hostname, parts.port or 80,
+                                               timeout=60)
+        self.prefix = parts.path.rstrip("/")
+        self.cookies = {}
+
+    def request(self, method, path, data=None):
+        headers = {}
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+        body = None
+        if data is not None:
+            body = urlencode(data)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        try:
+            self.conn.request(method, self.prefix + path, body=body, headers=headers)
+            resp = self.conn.getresponse()
+        except (http.client.HTTPException, OSError):
+            self.conn.close()                        # server đóng keep-alive: thử lại
+            self.conn.request(method, self.prefix + path, body=body, headers=headers)
+            resp = self.conn.getresponse()
+        payload = resp.read()
+        for header in resp.headers.get_all("Set-Cookie") or ():
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        if resp.getheader("Connection", "").lower() == "close":
+            self.conn.close()
+        return resp.status, payload
+
+
+# ---------- kịch bản ----------
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)         # endpoint -> [ms]
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def call(self, client, endpoint, method, path, data=None, ok=(200,)):
+        t0 = time.perf_counter()
+        status, body = client.request(method, path, data)
+        ms = (time.perf_counter() - t0) * 1000
+        with self._lock:
+            self.samples[endpoint].append(ms)
+            if status not in ok:
+                self.errors[endpoint] += 1
+        return status, body
+
+
+def login(client, username):
+    status, _ = client.request("POST", "/login",
+                               {"username": username, "password": PASSWORD})
+    if status != 302:
+        raise RuntimeError(f"đăng nhập {username} thất bại ({status})")
+
+
+def student_lifecycle(client, rec, exam_id, key, rng):
+    rec.call(client, "student.index", "GET", "/")
+    rec.call(client, "student.start_exam", "GET", f"/exam/{exam_id}/start")
+    form = {f"question_{q}": str(rng.choice(opts)) for q, opts in key[exam_id]}
+    rec.call(client, "student.submit_exam", "POST", f"/exam/{exam_id}/submit", form,
+             ok=(200, 302))
+
+
+def admin_round(client, rec, exam_ids, sub_ids, rng):
+    sort = rng.choice(("end_time", "score", "elapsed"))
+    rec.call(client, "admin.view_submissions", "GET",
+             f"/admin/exam/{rng.choice(exam_ids)}/submissions?sort={sort}")
+    rec.call(client, "admin.view_submission", "GET",
+             f"/admin/submission/{rng.choice(sub_ids)}")
+
+
+def load_fixture(rng, n_students):
+    """(học sinh [(username, exam_id)], key {exam: [(q, [opt])]}, exam_ids, sub_ids)."""
+    from app.extensions import db
+    from app.models import Exam, Option, Question, Submission, User
+
+    exams_by_class = defaultdict(list)
+    for exam_id, class_id in db.session.query(Exam.id, Exam.class_id):
+        exams_by_class[class_id].append(exam_id)
+    students = [(u, rng.choice(exams_by_class[c])) for u, c in
+                db.session.query(User.username, User.class_id)
+                .filter(User.is_admin.is_(False)).order_by(User.id).limit(n_students)]
+    key = defaultdict(dict)
+    for exam_id, q_id, opt_id in (db.session.query(Question.exam_id, Question.id, Option.id)
+                                  .join(Option, Option.question_id == Question.id)):
+        key[exam_id].setdefault(q_id, []).append(opt_id)
+    key = {e: list(qs.items()) for e, qs in key.items()}
+    sub_ids = [s for (s,) in db.session.query(Submission.id)
+               .order_by(db.func.random()).limit(2000)]
+    return students, key, sorted(key), sub_ids
+
+
+# ---------- số query (từ /admin/metrics) ----------
+_METRIC_RE = re.compile(r'^quiz_request_queries_(sum|count)\{([^}]*)\} (\S+)$')
+_LABEL_RE = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def scrape_queries(admin_client):
+    """{endpoint: [tổng query, số request]}, cộng dồn mọi nhãn worker.
+
+    Không có series nào (metric tắt, đổi format...) thì dừng hẳn: bảng q/req
+    toàn "-" sẽ lặng lẽ tắt luôn phần so sánh số query với baseline.
+    """
+    status, body = admin_client.request("GET", "/admin/metrics")
+    if status != 200:
+        raise SystemExit(f"/admin/metrics trả {status}: không đo được số query")
+    out = defaultdict(lambda: [0.0, 0.0])
+    for line in body.decode().splitlines():
+        m = _METRIC_RE.match(line)
+        if not m:
+            continue
+        labels = dict(_LABEL_RE.findall(m.group(2)))
+        if "endpoint" in labels:
+            out[labels["endpoint"]][0 if m.group(1) == "sum" else 1] += float(m.group(3))
+    if not out:
+        raise SystemExit("/admin/metrics không có series quiz_request_queries_*:"
+                         " kiểm tra METRICS_ENABLED / format metric")
+    return out
+
+
+def queries_per_request(before, after):
+    result = {}
+    for endpoint in ENDPOINTS:
+        q = after.get(endpoint, (0, 0))[0] - before.get(endpoint, (0, 0))[0]
+        n = after.get(endpoint, (0, 0))[1] - before.get(endpoint, (0, 0))[1]
+        result[endpoint] = round(q / n, 2) if n else None
+    return result
+
+
+# ---------- chạy ----------
+def summarize(rec, wall, queries):
+    out = {}
+    for endpoint in ENDPOINTS:
+        samples = sorted(rec.samples.get(endpoint, ()))
+        if not samples:
+            continue
+        if len(samples) > 1:
+            cuts = statistics.quantiles(samples, n=100, method="inclusive")
+            p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+        else:
+            p50 = p95 = p99 = samples[0]
+        out[endpoint] = {"n": len(samples), "errors": rec.errors.get(endpoint, 0),
+                         "p50_ms": round(p50, 2), "p95_ms": round(p95, 2),
+                         "p99_ms": round(p99, 2),
+                         "mean_ms": round(statistics.fmean(samples), 2),
+                         "queries": queries.get(endpoint)}
+    total = sum(len(s) for s in rec.samples.values())
+    return {"requests": total, "seconds": round(wall, 3),
+            "throughput_rps": round(total / wall, 1) if wall else None,
+            "endpoints": out}
+
+
+def run_client(app, args, fixture):
+    students, key, exam_ids, sub_ids = fixture
+    rng = random.Random(args.rng)
+    admin = TestClient(app)
+    login(admin, ADMIN)
+    clients = []
+    for username, exam_id in students:
+        client = TestClient(app)
+        login(client, username)
+        clients.append((client, exam_id))
+    for client, exam_id in clients[:args.warmup]:      # nạp cache, không tính
+        student_lifecycle(client, Recorder(), exam_id, key, rng)
+
+    rec = Recorder()
+    before = scrape_queries(admin)
+    t0 = time.perf_counter()
+    for _ in range(args.iterations):
+        for client, exam_id in clients:
+            student_lifecycle(client, rec, exam_id, key, rng)
+        for _ in range(args.admin_requests):
+            admin_round(admin, rec, exam_ids, sub_ids, rng)
+    wall = time.perf_counter() - t0
+    return summarize(rec, wall, queries_per_request(before, scrape_queries(admin)))
+
+
+def run_http(app, args, fixture):
+    students, key, exam_ids, sub_ids = fixture
+    server = None
+    base_url = args.url
+    if not base_url:
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        server = make_server("127.0.0.1", 0, app, threaded=True,
+                             request_handler=QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.port}"
+
+    try:
+        admin = HttpClient(base_url)
+        login(admin, ADMIN)
+        workers = []
+        for n in range(args.workers):
+            username, exam_id = students[n % len(students)]
+            client = HttpClient(base_url)
+            login(client, username)
+            workers.append((client, exam_id, random.Random(args.rng + n)))
+        for client, exam_id, rng in workers[:args.warmup]:
+            student_lifecycle(client, Recorder(), exam_id, key, rng)
+
+        rec = Recorder()
+        done = threading.Event()
+        barrier = threading.Barrier(len(workers) + 1)
+
+        def student(client, exam_id, rng):
+            barrier.wait()
+            for _ in range(args.iterations):
+                student_lifecycle(client, rec, exam_id, key, rng)
+
+        def admin_loop():
+            rng = random.Random(args.rng - 1)
+            client = HttpClient(base_url)
+            client.cookies = dict(admin.cookies)
+            barrier.wait()
+            while not done.is_set():
+                admin_round(client, rec, exam_ids, sub_ids, rng)
+
+        before = scrape_queries(admin)
+        threads = [threading.Thread(target=student, args=w) for w in workers]
+        threads.append(threading.Thread(target=admin_loop))
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads[:-1]:
+            t.join()
+        done.set()
+        threads[-1].join()
+        wall = time.perf_counter() - t0
+        return summarize(rec, wall, queries_per_request(before, scrape_queries(admin)))
+    finally:
+        if server is not None:
+            server.shutdown()
+
+
+def run(args):
+    meta = ensure_seed(args)
+    work = tempfile.NamedTemporaryFile(prefix="bench-", suffix=".db", delete=False).name
+    shutil.copyfile(args.db, work)                   # mỗi lần chạy: DB seed nguyên vẹn
+    _configure_env(work)
+
+    from app import create_app
+    from app.extensions import db
+
+    app = create_app()
+    app.logger.setLevel("ERROR")                     # bỏ log request chậm khi đo
+    report = {"meta": {"timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+                       "git": _git_rev(), "python": platform.python_version(),
+                       "platform": platform.platform(), "cpus": os.cpu_count(),
+                       "seed": meta, "args": {k: v for k, v in vars(args).items()
+                                              if k not in ("func", "json", "baseline")}},
+              "modes": {}}
+    try:
+        with app.app_context():
+            n = max(args.clients, args.workers)
+            fixture = load_fixture(random.Random(args.rng), n)
+            db.session.remove()
+        if args.mode in ("client", "both"):
+            report["modes"]["client"] = run_client(app, args, fixture)
+        if args.mode in ("http", "both"):
+            report["modes"]["http"] = run_http(app, args, fixture)
+    finally:
+        with app.app_context():
+            db.engine.dispose()
+        os.remove(work)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2, ensure_ascii=False)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        if compare(baseline, report, args.tolerance):
+            raise SystemExit(1)
+
+
+def _git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ---------- báo cáo ----------
+def print_report(report):
+    for mode, result in report["modes"].items():
+        print(f"\n[{mode}] {result['requests']} request trong {result['seconds']} s "
+              f"– {result['throughput_rps']} req/s")
+        print(f"  {'endpoint':<24}{'n':>6}{'p50':>9}{'p95':>9}{'p99':>9}"
+              f"{'mean':>9}{'q/req':>8}{'err':>5}")
+        for endpoint, r in result["endpoints"].items():
+            q = "-" if r["queries"] is None else f"{r['queries']:g}"
+            print(f"  {endpoint:<24}{r['n']:>6}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}"
+                  f"{r['p99_ms']:>9.1f}{r['mean_ms']:>9.1f}{q:>8}{r['errors']:>5}")
+
+
+def compare(baseline, report, tolerance):
+    """In chênh lệch với baseline. -> list các dòng bị coi là tệ hơn."""
+    regressions = []
+    print(f"\nSo với baseline {baseline['meta'].get('git')} "
+          f"({baseline['meta'].get('timestamp')}), ngưỡng p95 +{tolerance:.0%}:")
+    for mode, result in report["modes"].items():
+        base_mode = baseline.get("modes", {}).get(mode)
+        if not base_mode:
+            continue
+        for endpoint, r in result["endpoints"].items():
+            b = base_mode["endpoints"].get(endpoint)
+            if not b:
+                continue
+            change = (r["p95_ms"] - b["p95_ms"]) / b["p95_ms"] if b["p95_ms"] else 0.0
+            worse_q = (r["queries"] is not None and b["queries"] is not None
+                       and r["queries"] > b["queries"] + 0.5)
+            bad = change > tolerance or worse_q
+            flag = "REGRESSION" if bad else "ok"
+            print(f"  [{mode}] {endpoint:<24} p95 {b['p95_ms']:8.1f} -> {r['p95_ms']:8.1f} ms "
+                  f"({change:+.0%})  q/req {b['queries']} -> {r['queries']}  {flag}")
+            if bad:
+                regressions.append((mode, endpoint))
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    def seed_args(p):
+        p.add_argument("--db", default=DEFAULT_DB, help="DB seed (SQLite)")
+        p.add_argument("--classes", type=int, default=4)
+        p.add_argument("--students", type=int, default=400)
+        p.add_argument("--exams", type=int, default=2, help="số đề mỗi lớp")
+        p.add_argument("--questions", type=int, default=60)
+        p.add_argument("--options", type=int, default=4)
+        p.add_argument("--history", type=int, default=25,
+                       help="số lượt cũ mỗi học sinh mỗi đề")
+        p.add_argument("--rng", type=int, default=42)
+
+    p_seed = sub.add_parser("seed", help="tạo DB benchmark")
+    seed_args(p_seed)
+    p_seed.set_defaults(func=seed)
+
+    p_run = sub.add_parser("run", help="chạy benchmark")
+    seed_args(p_run)
+    p_run.add_argument("--mode", choices=("client", "http", "both"), default="both")
+    p_run.add_argument("--clients", type=int, default=50,
+                       help="số học sinh ở chế độ client")
+    p_run.add_argument("--workers", type=int, default=16,
+                       help="số thread học sinh đồng thời ở chế độ http")
+    p_run.add_argument("--iterations", type=int, default=3,
+                       help="số lượt thi mỗi học sinh")
+    p_run.add_argument("--admin-requests", type=int, default=10,
+                       help="số vòng xem bài của admin mỗi iteration (client)")
+    p_run.add_argument("--warmup", type=int, default=2)
+    p_run.add_argument("--url", help="server có sẵn thay cho server cục bộ (http)")
+    p_run.add_argument("--json", help="ghi kết quả JSON")
+    p_run.add_argument("--baseline", help="file JSON để so sánh")
+    p_run.add_argument("--tolerance", type=float, default=0.2,
+                       help="p95 tăng quá tỉ lệ này = regression")
+    p_run.set_defaults(func=run)
+
+    args = ap.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""So sánh render phần câu hỏi của take_exam khi cache Markdown lạnh / nóng.
+
+    python -m benchmarks.bench_markdown [--questions 40] [--options 4] [--repeat 20]
+
+Ba chế độ:
+  cold     – xoá LRU + bỏ text_html, mỗi lần render chạy markdown2 + bleach
+  lru      – LRU đã nóng, text_html vẫn trống
+  stored   – dùng text_html đã lưu trong DB (đường đi thực tế sau khi admin lưu)
+"""
+import argparse
+import os
+import statistics
+import time
+
+os.environ.setdefault("DATABASE_URI", "sqlite://")
+
+from flask import render_template                          # noqa: E402
+
+from app import create_app, migrations                     # noqa: E402
+from app.extensions import db                              # noqa: E402
+from app.models import Exam, Question, Option              # noqa: E402
+from app.utils import md_safe, _md_cache                   # noqa: E402
+
+SAMPLE = """Cho hàm số **f(x) = x^2 + {n}x**. Tính $f'({n})$.
+
+```python
+def f(x):
+    return x ** 2 + {n} * x
+```
+
+- gợi ý *một*
+- gợi ý `hai`
+"""
+
+
+def seed(n_questions, n_options):
+    exam = Exam(title="Benchmark", duration_minutes=60)
+    db.session.add(exam)
+    for n in range(n_questions):
+        q = Question(text=SAMPLE.format(n=n), order_idx=n + 1, exam=exam)
+        db.session.add(q)
+        for i in range(n_options):
+            db.session.add(Option(text=f"Đáp án **{i}** = $x_{{{n}}}^{i}$",
+                                  is_correct=(i == 0), question=q))
+    db.session.commit()
+    return exam.id
+
+
+def fill_html(exam):
+    for q in exam.questions:
+        q.text_html = md_safe(q.text)
+        for opt in q.options:
+            opt.text_html = md_safe(opt.text)
+    db.session.commit()
+
+
+def clear_html(exam):
+    for q in exam.questions:
+        q.text_html = None
+        for opt in q.options:
+            opt.text_html = None
+    db.session.commit()
+
+
+def timed_render(exam, repeat, before=None):
+    samples = []
+    for _ in range(repeat):
+        if before:
+            before()
+        t0 = time.perf_counter()
+        render_template("_exam_questions.html",
+                        questions=exam.questions, read_only=False)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--questions", type=int, default=40)
+    ap.add_argument("--options", type=int, default=4)
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    app = create_app()
+    with app.test_request_context():
+        db.create_all()                   # create_app không tạo schema (flask db init)
+        migrations.upgrade()
+        exam = db.session.get(Exam, seed(args.questions, args.options))
+        for q in exam.questions:          # nạp sẵn để chỉ đo phần render
+            q.options
+
+        clear_html(exam)
+        results = {"cold": timed_render(exam, args.repeat, _md_cache.clear)}
+        results["lru"] = timed_render(exam, args.repeat)
+        fill_html(exam)
+        _md_cache.clear()
+        results["stored"] = timed_render(exam, args.repeat)
+
+    print(f"_exam_questions.html: {args.questions} câu x {args.options} đáp án, "
+          f"{args.repeat} lần")
+    base = statistics.median(results["cold"])
+    for name, samples in results.items():
+        med = statistics.median(samples)
+        print(f"  {name:<7} median {med:8.2f} ms   "
+              f"min {min(samples):8.2f} ms   x{base / med:5.1f}")
+
+
+if __name__ == "__main__":
+    main()
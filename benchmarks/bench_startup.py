@@ -0,0 +1,109 @@
+"""Thời gian khởi động lạnh của một worker: import app + create_app().
+
+    python -m benchmarks.bench_startup [--repeat 10] [--top 15] [--json out.json]
+                                       [--max-ms 1500]
+
+Mỗi lần đo chạy trong một process Python mới (như gunicorn fork/recycle một
+worker), tách phần import và phần create_app. ``--top`` in các module import
+chậm nhất (``python -X importtime``); ``--max-ms`` trả mã 1 khi median tổng
+vượt ngưỡng – dùng được trong CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, time
+t0 = time.perf_counter()
+from app import create_app
+t1 = time.perf_counter()
+app = create_app()
+t2 = time.perf_counter()
+heavy = [m for m in ("numpy", "markdown2", "bleach", "dateutil", "PIL")
+         if m in __import__("sys").modules]
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "create_ms": (t2 - t1) * 1000,
+                  "heavy": heavy}))
+"""
+
+
+def _env():
+    tmp = tempfile.mkdtemp(prefix="bench-startup-")
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URI", f"sqlite:///{os.path.join(tmp, 'quiz.db')}")
+    env.setdefault("SESSION_SQLITE_PATH", os.path.join(tmp, "sessions.db"))
+    env.setdefault("SUBMIT_QUEUE_PATH", os.path.join(tmp, "submit_queue.db"))
+    return env
+
+
+def probe(env):
+    out = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def slowest_imports(env, top):
+    """[(ms gộp, module)] chậm nhất theo -X importtime."""
+    err = subprocess.run([sys.executable, "-X", "importtime", "-c",
+                          "from app import create_app; create_app()"],
+                         cwd=ROOT, env=env, capture_output=True, text=True,
+                         check=True).stderr
+    rows = []
+    for line in err.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].rstrip()
+        if len(name) - len(name.lstrip()) <= 3:        # chỉ module cấp ngoài cùng
+            rows.append((int(parts[1]) / 1000, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--repeat", type=int, default=10)
+    ap.add_argument("--top", type=int, default=15)
+    ap.add_argument("--json", help="ghi kết quả JSON")
+    ap.add_argument("--max-ms", type=float, help="ngưỡng median tổng (ms)")
+    args = ap.parse_args()
+
+    env = _env()
+    probe(env)                                  # lần đầu: .pyc, cache của OS
+    runs = [probe(env) for _ in range(args.repeat)]
+    result = {}
+    for key in ("import_ms", "create_ms"):
+        values = [r[key] for r in runs]
+        result[key] = {"median": round(statistics.median(values), 1),
+                       "min": round(min(values), 1), "max": round(max(values), 1)}
+    totals = [r["import_ms"] + r["create_ms"] for r in runs]
+    result["total_ms"] = {"median": round(statistics.median(totals), 1),
+                          "min": round(min(totals), 1), "max": round(max(totals), 1)}
+    result["heavy_modules_loaded"] = runs[-1]["heavy"]
+
+    print(f"khởi động lạnh, {args.repeat} process:")
+    for key in ("import_ms", "create_ms", "total_ms"):
+        r = result[key]
+        print(f"  {key:<10} median {r['median']:8.1f} ms   "
+              f"min {r['min']:8.1f}   max {r['max']:8.1f}")
+    print(f"  module nặng đã nạp: {', '.join(result['heavy_modules_loaded']) or '(không)'}")
+    if args.top:
+        result["slowest_imports"] = slowest_imports(env, args.top)
+        print("  import chậm nhất (ms, gộp cả module con):")
+        for ms, name in result["slowest_imports"]:
+            print(f"    {ms:8.1f}  {name}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(result, fh, indent=2)
+    if args.max_ms and result["total_ms"]["median"] > args.max_ms:
+        print(f"median {result['total_ms']['median']} ms > {args.max_ms} ms", file=sys.stderr)
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
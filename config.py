@@ -11,3 +11,49 @@ class Config:
     UPLOAD_FOLDER = "app/static/uploads"
     MAX_CONTENT_LENGTH = 4 * 1024 * 1024      # 4 MB/ảnh
     ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "webp", "avif"}
+    IMAGE_WORKERS = 2                         # thread tạo biến thể ảnh
+    HASH_WORKERS = None                       # process hash mật khẩu khi nhập user (None = số CPU)
+    UPLOAD_GC_GRACE_SECONDS = 3600            # ảnh mới lưu chưa bị GC trong 1h
+
+    # Thread nền (autosave, sweeper, hàng đợi nộp bài, dọn session) – app/background.py.
+    # Khởi động ở request đầu tiên; None = bật trừ khi TESTING, "0" = tắt hẳn.
+    BACKGROUND_THREADS = {"1": True, "0": False}.get(os.getenv("BACKGROUND_THREADS"))
+
+    # File tĩnh (app/assets.py): None = send_file, "x-sendfile" (Apache/lighttpd)
+    # hoặc "x-accel-redirect" (Nginx, location internal tại STATIC_ACCEL_PREFIX)
+    STATIC_SENDFILE = os.getenv("STATIC_SENDFILE") or None
+    STATIC_ACCEL_PREFIX = "/_static/"
+
+    # Session phía server (app/sessions.py): "sqlite" | "file" | "module:Class" | "cookie"
+    SESSION_BACKEND = os.getenv("SESSION_BACKEND", "sqlite")
+    SESSION_SQLITE_PATH = os.getenv(
+        "SESSION_SQLITE_PATH", os.path.join(BASE_DIR, "sessions.db"))
+    SESSION_FILE_DIR = os.path.join(BASE_DIR, "sessions")
+    SESSION_CLEANUP_INTERVAL = 600            # giây giữa hai lần dọn session hết hạn
+
+    # Autosave đáp án (app/autosave.py)
+    # chu kỳ ghi buffer xuống DB (0 = ghi ngay trong request, không thread nền).
+    # Buffer là của từng worker: saved_answers()/sweeper ở worker khác chậm tối đa
+    # chừng này giây – giữ nhỏ hơn nhiều so với EXAM_GRACE_SECONDS.
+    AUTOSAVE_FLUSH_SECONDS = int(os.getenv("AUTOSAVE_FLUSH_SECONDS", "5"))
+    AUTOSAVE_MAX_PENDING = 500                # số lượt trong buffer -> ghi sớm
+    AUTOSAVE_DEBOUNCE_MS = 2000               # client gom thay đổi trước khi gửi
+
+    # Hạn làm bài (app/sweeper.py)
+    EXAM_GRACE_SECONDS = 120                  # ân hạn sau khi hết giờ (trễ mạng)
+    SWEEPER_INTERVAL = 60                     # giây giữa hai lần chốt lượt quá giờ (0 = tắt)
+
+    # Đo hiệu năng (app/metrics.py) – GET /admin/metrics
+    METRICS_ENABLED = os.getenv("METRICS", "1") == "1"
+    METRICS_SLOW_MS = 500                     # request chậm hơn: log kèm danh sách query
+    METRICS_QUERY_WARN = 50                   # hoặc nhiều query hơn (N+1)
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")  # Bearer token cho Prometheus scraper
+
+    # Nộp bài qua hàng đợi (app/ingest.py) – tắt mặc định
+    SUBMIT_QUEUE_ENABLED = os.getenv("SUBMIT_QUEUE", "0") == "1"
+    SUBMIT_QUEUE_PATH = os.getenv(
+        "SUBMIT_QUEUE_PATH", os.path.join(BASE_DIR, "submit_queue.db"))
+    SUBMIT_QUEUE_WORKERS = int(os.getenv("SUBMIT_QUEUE_WORKERS", "2"))
+    SUBMIT_QUEUE_BATCH = 50
+    SUBMIT_QUEUE_STALE_SECONDS = 60      # entry lỗi được thử lại sau chừng này giây
+    SUBMIT_QUEUE_MAX_ATTEMPTS = 5        # lỗi tới lần này thì entry bị đánh dấu chết